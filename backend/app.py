@@ -6,15 +6,17 @@ from routes import api
 from flask_swagger_ui import get_swaggerui_blueprint
 from auth import setup_oauth, auth_bp
 from flask_cors import CORS
+import metrics
 
 app = Flask(__name__)
 # todo configure CORS
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 app.config.from_object(Config)
 
 db.init_app(app)
 migrate = Migrate(app, db)
 setup_oauth(app)
+metrics.init_app(app)
 
 app.register_blueprint(api)
 app.register_blueprint(auth_bp, url_prefix='/auth')
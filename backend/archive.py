@@ -0,0 +1,183 @@
+import json
+import zlib
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import selectinload
+from models import db, FormContainer, Form, Response, Answer, TimelineEntry, EmailOutbox, ArchivedContainer
+from config import Config
+import stats
+import search
+from cache import forget_access_tokens
+
+CONTAINER_COLUMNS = (
+    'id', 'access_token', 'title', 'description', 'user_email', 'manager_email', 'reference', 'escalate', 'validated',
+    'initiated_by', 'created_at', 'updated_at', 'reminder_delay', 'last_reminder_sent', 'reminder_count', 'escalated',
+)
+DATETIME_COLUMNS = ('created_at', 'updated_at', 'last_reminder_sent')
+
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+def parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def container_document(form_container):
+    """Everything the container owns, as JSON-compatible data; questions stay in their shared template."""
+    document = {column: getattr(form_container, column) for column in CONTAINER_COLUMNS}
+    for column in DATETIME_COLUMNS:
+        document[column] = isoformat(document[column])
+    document["forms"] = [
+        {
+            "id": form.id,
+            "status": form.status,
+            "template_id": form.template_id,
+            "responses": [
+                {
+                    "id": response.id,
+                    "responder_uid": response.responder_uid,
+                    "submitted_at": isoformat(response.submitted_at),
+                    "answers": [
+                        {"question_id": answer.question_id, "value_text": answer.value_text,
+                         "value_options": answer.value_options}
+                        for answer in response.answers
+                    ],
+                }
+                for response in form.responses
+            ],
+        }
+        for form in form_container.forms
+    ]
+    document["timeline"] = [
+        {"id": entry.id, "event": entry.event, "details": entry.details, "timestamp": isoformat(entry.timestamp)}
+        for entry in form_container.timeline
+    ]
+    return document
+
+
+def stats_contribution(document):
+    """The container's share of the dashboard rollup, counted the way stats.rebuild_stats counts hot containers."""
+    counts = Counter(
+        containers=1, escalations=int(any(entry["event"] == 'Escalation sent' for entry in document["timeline"]))
+    )
+    buckets = Counter()
+    created_at = parse_datetime(document["created_at"])
+    for form in document["forms"]:
+        if form["status"] in stats.STATUS_COLUMNS:
+            counts[stats.STATUS_COLUMNS[form["status"]]] += 1
+        counts["responses"] += len(form["responses"])
+        for response in form["responses"]:
+            buckets[stats.answer_time_bucket(parse_datetime(response["submitted_at"]) - created_at)] += 1
+    counts["responded_containers"] = int(counts["responses"] > 0)
+    counts["reminders_sent"] = sum(1 for entry in document["timeline"] if entry["event"].startswith('Reminder '))
+    return dict(counts, answer_buckets={str(bucket): count for bucket, count in buckets.items()})
+
+
+def archivable_container_ids(cutoff, after_id=0):
+    return db.session.scalars(
+        select(FormContainer.id)
+        .where(FormContainer.validated.is_(True), FormContainer.updated_at < cutoff, FormContainer.id > after_id)
+        .order_by(FormContainer.id).limit(Config.ARCHIVE_BATCH_SIZE)
+    ).all()
+
+
+def archive_containers(container_ids):
+    """Move validated containers and everything they own into archived_form_containers, in one transaction."""
+    form_containers = FormContainer.query.options(
+        selectinload(FormContainer.forms).selectinload(Form.responses).selectinload(Response.answers),
+        selectinload(FormContainer.timeline),
+    ).filter(
+        FormContainer.id.in_(container_ids), FormContainer.validated.is_(True)
+    ).with_for_update(skip_locked=True, of=FormContainer).all()
+    if not form_containers:
+        return 0
+
+    now = datetime.utcnow()
+    rows = []
+    for form_container in form_containers:
+        document = container_document(form_container)
+        rows.append({
+            "id": form_container.id,
+            "access_token": form_container.access_token,
+            "initiated_by": form_container.initiated_by,
+            "reference": form_container.reference,
+            "created_at": form_container.created_at,
+            "archived_at": now,
+            "payload": zlib.compress(json.dumps(document, separators=(',', ':')).encode()),
+            "stats": stats_contribution(document),
+        })
+    db.session.execute(insert(ArchivedContainer), rows)
+
+    ids = [form_container.id for form_container in form_containers]
+    search.unindex_containers(ids)
+    form_ids = select(Form.id).where(Form.form_container_id.in_(ids))
+    response_ids = select(Response.id).where(Response.form_id.in_(form_ids))
+    for statement in (
+        delete(Answer).where(Answer.response_id.in_(response_ids)),
+        delete(Response).where(Response.form_id.in_(form_ids)),
+        delete(Form).where(Form.form_container_id.in_(ids)),
+        delete(TimelineEntry).where(TimelineEntry.form_container_id.in_(ids)),
+        # Sent emails are kept as history, detached from the container
+        update(EmailOutbox).where(EmailOutbox.form_container_id.in_(ids)).values(form_container_id=None),
+        delete(FormContainer).where(FormContainer.id.in_(ids)),
+    ):
+        db.session.execute(statement.execution_options(synchronize_session=False))
+    db.session.commit()
+    # The instances are expired by the commit and their rows are gone: use the tokens captured in rows
+    forget_access_tokens([row["access_token"] for row in rows])
+    return len(ids)
+
+
+def load_document(archived):
+    return json.loads(zlib.decompress(archived.payload))
+
+
+def rehydrate(archived):
+    """Rebuild the container tree as transient objects (never added to the session) for the read path.
+
+    Returns the container and the answers of each response as {response_id: {question_id: value}}.
+    """
+    document = load_document(archived)
+    form_container = FormContainer(**{
+        column: parse_datetime(document[column]) if column in DATETIME_COLUMNS else document[column]
+        for column in CONTAINER_COLUMNS
+    })
+    answers = {}
+    forms = []
+    for form_data in document["forms"]:
+        responses = []
+        for response_data in form_data["responses"]:
+            responses.append(Response(
+                id=response_data["id"],
+                form_id=form_data["id"],
+                responder_uid=response_data["responder_uid"],
+                submitted_at=parse_datetime(response_data["submitted_at"]),
+            ))
+            answers[response_data["id"]] = {
+                answer["question_id"]: answer["value_options"] if answer["value_options"] is not None
+                else answer["value_text"]
+                for answer in response_data["answers"]
+            }
+        forms.append(Form(id=form_data["id"], form_container_id=archived.id, template_id=form_data["template_id"],
+                          status=form_data["status"], responses=responses))
+    form_container.forms = forms
+    return form_container, answers
+
+
+def timeline_page(archived, since, limit):
+    """Archived timeline entries after the since cursor, oldest first, as transient TimelineEntry objects."""
+    entries = sorted(
+        (
+            TimelineEntry(id=entry["id"], form_container_id=archived.id, event=entry["event"],
+                          details=entry["details"], timestamp=parse_datetime(entry["timestamp"]))
+            for entry in load_document(archived)["timeline"]
+        ),
+        key=lambda entry: (entry.timestamp, entry.id)
+    )
+    if since:
+        entries = [entry for entry in entries if (entry.timestamp, entry.id) > since]
+    return entries[:limit]
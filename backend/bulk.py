@@ -0,0 +1,184 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, update
+from models import db, FormContainer, Form, TimelineEntry, EmailOutbox
+from cache import invalidate_containers, forget_access_tokens
+from events import timeline_event, publish_events
+import stats
+from tokens import sign_access_token
+
+BULK_ACTIONS = ('validate', 'close', 'resend')
+BULK_FILTERS = ('reference', 'initiated_by', 'status', 'created_from', 'created_to')
+BULK_CHUNK_SIZE = 1000
+# Above this many containers the action runs as a Celery job instead of in the request
+BULK_SYNC_LIMIT = 1000
+
+TIMELINE_EVENTS = {
+    'validate': ('FormContainer validated', 'Form container validated by {admin_id} (bulk)'),
+    'close': ('FormContainer closed', 'Reminders and escalation stopped by {admin_id} (bulk)'),
+    'resend': ('Notification resent', 'Notification resent to {user_email} by {admin_id} (bulk)'),
+}
+
+
+def container_conditions(filters):
+    """WHERE clauses for the bulk filters; raises ValueError on an invalid date."""
+    conditions = [FormContainer.validated.isnot(True)]
+    if filters.get('reference'):
+        conditions.append(FormContainer.reference == filters['reference'])
+    if filters.get('initiated_by'):
+        conditions.append(FormContainer.initiated_by == filters['initiated_by'])
+    if filters.get('status'):
+        conditions.append(db.exists().where(Form.form_container_id == FormContainer.id, Form.status == filters['status']))
+    if filters.get('created_from'):
+        conditions.append(FormContainer.created_at >= datetime.fromisoformat(filters['created_from']))
+    if filters.get('created_to'):
+        conditions.append(FormContainer.created_at < datetime.fromisoformat(filters['created_to']))
+    return conditions
+
+
+def count_containers(container_ids=None, filters=None):
+    if container_ids is not None:
+        return len(set(container_ids))
+    return db.session.scalar(select(func.count()).select_from(FormContainer).where(*container_conditions(filters)))
+
+
+def container_id_chunks(container_ids=None, filters=None):
+    """Yield id chunks in id order; filtered ids are re-read per chunk by keyset, so rows changed by earlier chunks drop out."""
+    if container_ids is not None:
+        ordered = sorted(set(container_ids))
+        for start in range(0, len(ordered), BULK_CHUNK_SIZE):
+            yield ordered[start:start + BULK_CHUNK_SIZE]
+        return
+    conditions = container_conditions(filters)
+    last_id = 0
+    while True:
+        chunk = db.session.scalars(
+            select(FormContainer.id).where(FormContainer.id > last_id, *conditions)
+            .order_by(FormContainer.id).limit(BULK_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1]
+
+
+def claim_containers(container_ids, *conditions, **values):
+    """UPDATE the containers that still qualify and return their rows: concurrent runs never both change a container."""
+    return db.session.execute(
+        update(FormContainer)
+        .where(FormContainer.id.in_(container_ids), FormContainer.validated.isnot(True), *conditions)
+        .values(updated_at=datetime.utcnow(), **values)
+        .returning(FormContainer.id, FormContainer.access_token, FormContainer.initiated_by, FormContainer.reference,
+                   FormContainer.user_email, FormContainer.title)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def validate_containers(container_ids):
+    """Validate each container and its latest form, keeping the dashboard rollup in step."""
+    containers = claim_containers(container_ids, validated=True, next_reminder_at=None)
+    if not containers:
+        return containers
+    latest_forms = db.session.execute(
+        select(Form.id, Form.form_container_id, Form.status).where(Form.id.in_(
+            select(func.max(Form.id)).where(Form.form_container_id.in_([c.id for c in containers]))
+            .group_by(Form.form_container_id)
+        ))
+    ).all()
+    db.session.execute(
+        update(Form).where(Form.id.in_([form.id for form in latest_forms])).values(status='validated')
+        .execution_options(synchronize_session=False)
+    )
+    old_status = {form.form_container_id: form.status for form in latest_forms}
+    deltas = {}
+    for container in containers:
+        if container.id not in old_status:
+            continue
+        key = (container.initiated_by, container.reference)
+        deltas.setdefault(key, Counter())
+        if old_status[container.id] in stats.STATUS_COLUMNS:
+            deltas[key][stats.STATUS_COLUMNS[old_status[container.id]]] -= 1
+        deltas[key][stats.STATUS_COLUMNS['validated']] += 1
+    for (initiated_by, reference), counter in deltas.items():
+        stats.record(initiated_by, reference, **counter)
+    return containers
+
+
+def close_containers(container_ids):
+    """Stop reminders and escalation without validating.
+
+    The container keeps its escalate setting: it is marked as escalated for its latest form, so adding a form
+    restarts the reminder cycle with the escalation the container was created with.
+    """
+    return claim_containers(
+        container_ids,
+        (FormContainer.next_reminder_at.isnot(None)) | (FormContainer.escalated.is_(False)),
+        next_reminder_at=None,
+        escalated=True,
+    )
+
+
+def resend_notifications(container_ids):
+    containers = claim_containers(container_ids)
+    if containers:
+        db.session.execute(insert(EmailOutbox), [
+            {
+                "form_container_id": container.id,
+                "to": container.user_email,
+                "subject": "Reminder: New Form Notification",
+                "body": f"A form is waiting for your response: {container.title}.",
+                "link": sign_access_token(container.access_token),
+                "kind": 'notification',
+            }
+            for container in containers
+        ])
+    return containers
+
+
+ACTION_HANDLERS = {
+    'validate': validate_containers,
+    'close': close_containers,
+    'resend': resend_notifications,
+}
+
+
+def apply_action(action, container_ids, admin_id):
+    """Apply action to one chunk with set-based statements and commit; returns the number of containers changed."""
+    containers = ACTION_HANDLERS[action](container_ids)
+    now = datetime.utcnow()
+    event, details = TIMELINE_EVENTS[action]
+    entries = [
+        {
+            "form_container_id": container.id,
+            "event": event,
+            "details": details.format(admin_id=admin_id, user_email=container.user_email),
+            "timestamp": now,
+        }
+        for container in containers
+    ]
+    if entries:
+        db.session.execute(insert(TimelineEntry), entries)
+    db.session.commit()
+
+    invalidate_containers([(container.access_token, container.id) for container in containers])
+    if action == 'validate':
+        forget_access_tokens([container.access_token for container in containers])
+    initiated_by = {container.id: container.initiated_by for container in containers}
+    publish_events([
+        timeline_event(initiated_by[entry["form_container_id"]], entry["form_container_id"], entry["event"],
+                       entry["details"], entry["timestamp"], bulk=True)
+        for entry in entries
+    ])
+    return len(containers)
+
+
+def run_bulk_action(action, admin_id, container_ids=None, filters=None, on_progress=None):
+    """Apply action chunk by chunk, one transaction per chunk; on_progress(processed, changed) runs after each chunk."""
+    processed = changed = 0
+    for chunk in container_id_chunks(container_ids, filters):
+        changed += apply_action(action, chunk, admin_id)
+        processed += len(chunk)
+        if on_progress:
+            on_progress(processed, changed)
+    return {"action": action, "processed": processed, "changed": changed}
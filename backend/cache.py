@@ -0,0 +1,264 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from flask import current_app, request, Response
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRUCache:
+    """Bounded in-process cache with per-entry TTL, used when Redis is not reachable."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class ResponseCache:
+    """Pre-serialized JSON bodies keyed by resource, stored in Redis with an in-process LRU fallback.
+
+    Bodies that must never go stale are read with get_current / set_current and dropped with invalidate:
+    every invalidation bumps a generation, and a body built before it is never stored or served afterwards.
+    """
+
+    def __init__(self, redis_url, ttl, local_maxsize, retry_interval, local_ttl=None):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.local = LocalLRUCache(local_maxsize, local_ttl or ttl)
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5) \
+            if redis_url else None
+        self._redis_down_until = 0
+        # Outlives every body stored under it, so an expired generation never revives an old body
+        self.generation_ttl = 2 * ttl
+        # The in-process tier uses a single generation: any local invalidation discards bodies being built
+        self._local_generation = 0
+        self._local_lock = threading.Lock()
+        # Keys whose invalidation could not reach Redis, sent again before Redis is used for anything else
+        self._unsent_invalidations = set()
+
+    def _backend(self):
+        if self.redis is None or self._redis_down_until >= time.monotonic():
+            return None
+        if self._unsent_invalidations and not self._replay_invalidations():
+            return None
+        return self.redis
+
+    def _redis_failed(self, error):
+        logger.warning("Redis cache unavailable, falling back to in-process cache: %s", error)
+        self._redis_down_until = time.monotonic() + self.retry_interval
+
+    def get(self, key):
+        backend = self._backend()
+        if backend is not None:
+            try:
+                return backend.get(key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        return self.local.get(key)
+
+    def set(self, key, value):
+        backend = self._backend()
+        if backend is not None:
+            try:
+                backend.set(key, value, ex=self.ttl)
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        self.local.set(key, value)
+
+    def get_current(self, key):
+        """Return (body, generation); body is None on a miss. Pass generation to set_current with the built body."""
+        local_generation = self._local_generation
+        backend = self._backend()
+        if backend is not None:
+            try:
+                stored, generation = backend.mget(key, generation_key(key))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+            else:
+                generation = generation or b"0"
+                if stored is not None:
+                    stored_generation, body = stored.split(b"\n", 1)
+                    if stored_generation == generation:
+                        return body, (generation, local_generation)
+                return None, (generation, local_generation)
+        return self.local.get(key), (None, local_generation)
+
+    def set_current(self, key, body, generation):
+        """Store body unless key was invalidated since get_current returned generation."""
+        redis_generation, local_generation = generation
+        backend = self._backend()
+        if backend is not None and redis_generation is not None:
+            try:
+                # Tagged with the generation it was built under; get_current ignores it once the generation moves on
+                backend.set(key, redis_generation + b"\n" + body, ex=self.ttl)
+                return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+        with self._local_lock:
+            if local_generation == self._local_generation:
+                self.local.set(key, body)
+
+    def invalidate(self, *keys):
+        """Drop keys and bump their generation so bodies being built from older data are not stored."""
+        if not keys:
+            return
+        with self._local_lock:
+            self._local_generation += 1
+            self.local.delete(*keys)
+        if self.redis is None:
+            return
+        # Sent even while this process considers Redis down: the other processes may still serve these keys from it
+        try:
+            self._send_invalidations(keys)
+        except redis.RedisError as e:
+            with self._local_lock:
+                self._unsent_invalidations.update(keys)
+            self._redis_failed(e)
+
+    def _send_invalidations(self, keys):
+        pipeline = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(generation_key(key))
+            pipeline.expire(generation_key(key), self.generation_ttl)
+        pipeline.delete(*keys)
+        pipeline.execute()
+
+    def _replay_invalidations(self):
+        with self._local_lock:
+            keys = list(self._unsent_invalidations)
+        try:
+            self._send_invalidations(keys)
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return False
+        with self._local_lock:
+            self._unsent_invalidations.difference_update(keys)
+        return True
+
+    def delete(self, *keys):
+        # Always clear the local copy too, it may have been filled while Redis was down
+        self.local.delete(*keys)
+        backend = self._backend()
+        if backend is not None and keys:
+            try:
+                backend.delete(*keys)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+
+def generation_key(key):
+    return f"generation:{key}"
+
+
+response_cache = ResponseCache(Config.CACHE_REDIS_URL, Config.CACHE_TTL, Config.CACHE_LOCAL_MAXSIZE,
+                               Config.CACHE_REDIS_RETRY_INTERVAL, Config.CACHE_LOCAL_TTL)
+
+
+# Token -> container id: an access token always designates the same container, so entries only expire or are dropped
+token_cache = ResponseCache(Config.CACHE_REDIS_URL, Config.TOKEN_CACHE_TTL, Config.TOKEN_CACHE_LOCAL_MAXSIZE,
+                            Config.CACHE_REDIS_RETRY_INTERVAL)
+# Per-process tier in front of Redis so hot tokens resolve without a network round trip
+token_local_cache = LocalLRUCache(Config.TOKEN_CACHE_LOCAL_MAXSIZE, Config.TOKEN_CACHE_LOCAL_TTL)
+
+
+def container_key(access_token):
+    return f"form-container:{access_token}"
+
+
+def timeline_key(container_id):
+    return f"form-container-timeline:{container_id}"
+
+
+def token_key(access_token):
+    return f"access-token:{access_token}"
+
+
+def cached_container_id(access_token):
+    key = token_key(access_token)
+    value = token_local_cache.get(key)
+    if value is None:
+        value = token_cache.get(key)
+        if value is None:
+            return None
+        token_local_cache.set(key, value)
+    return int(value)
+
+
+def remember_container_id(access_token, container_id):
+    key = token_key(access_token)
+    token_local_cache.set(key, str(container_id))
+    token_cache.set(key, str(container_id))
+
+
+def forget_access_tokens(access_tokens):
+    keys = [token_key(access_token) for access_token in access_tokens]
+    token_local_cache.delete(*keys)
+    token_cache.delete(*keys)
+
+
+def invalidate_container(access_token, container_id):
+    invalidate_containers([(access_token, container_id)])
+
+
+def invalidate_containers(containers):
+    """Drop the cached bodies of (access_token, container_id) pairs in a single round trip."""
+    response_cache.invalidate(*[
+        key for access_token, container_id in containers for key in (container_key(access_token), timeline_key(container_id))
+    ])
+
+
+def invalidate_timelines(container_ids):
+    response_cache.invalidate(*[timeline_key(container_id) for container_id in container_ids])
+
+
+def cached_json_response(key, build):
+    """Serve the cached body for key, or build() it. build returns the payload to cache, or a response to send as is.
+
+    The body is stored as '<etag>\\n<json>' so conditional requests are answered without re-hashing. It is only
+    stored if the key was not invalidated while it was being built, so a write never leaves an older body behind.
+    """
+    cached, generation = response_cache.get_current(key)
+    if cached is None:
+        payload = build()
+        if isinstance(payload, tuple):
+            return payload
+        body = current_app.json.dumps(payload).encode()
+        cached = hashlib.sha1(body).hexdigest().encode() + b"\n" + body
+        response_cache.set_current(key, cached, generation)
+
+    etag, body = cached.split(b"\n", 1)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag.decode())
+    return response.make_conditional(request)
@@ -1,17 +1,110 @@
+"""Celery application: queues, routing and the beat schedule.
+
+Each kind of work has its own queue so a large reminder sweep or bulk job never delays a new form notification.
+Run one worker per queue group, for example:
+
+    celery -A celery_app worker -Q escalations,reminders -c 4 --prefetch-multiplier 1
+    celery -A celery_app worker -Q notifications,default -c 2
+    celery -A celery_app worker -Q bulk -c 1 -O fair
+
+A worker consuming several queues drains them in the order given by -Q (escalations before reminders).
+
+Each worker exports its task and SMTP metrics on its own port, aggregated from its own empty multiprocess
+directory (see metrics.py), for example:
+
+    rm -rf /tmp/metrics-reminders && mkdir /tmp/metrics-reminders
+    export PROMETHEUS_MULTIPROC_DIR=/tmp/metrics-reminders METRICS_WORKER_PORT=9101
+    celery -A celery_app worker -Q escalations,reminders -c 4 --prefetch-multiplier 1
+"""
 from celery import Celery
+from kombu import Queue
 from config import Config
 
+QUEUES = ('default', 'notifications', 'reminders', 'escalations', 'bulk')
+
+# File d'envoi de deliver_outbox selon le type d'email
+OUTBOX_QUEUES = {
+    'notification': 'notifications',
+    'reminder': 'reminders',
+    'escalation': 'escalations',
+}
+
+# Priorité des messages : avec Redis, 0 est la plus haute
+OUTBOX_PRIORITIES = {
+    'escalation': 0,
+    'notification': 3,
+    'reminder': 6,
+}
+
+TASK_QUEUES = {
+    'tasks.dispatch_due_reminders': 'reminders',
+    'tasks.process_reminder_batch': 'reminders',
+    'tasks.send_reminder_task': 'reminders',
+    'tasks.escalate_task': 'escalations',
+    'tasks.bulk_action_task': 'bulk',
+    'tasks.archive_validated_containers': 'bulk',
+    'tasks.rebuild_stats_task': 'bulk',
+    'tasks.rebuild_search_index_task': 'bulk',
+}
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    if name == 'tasks.deliver_outbox':
+        kind = (kwargs or {}).get('kind')
+        if kind in OUTBOX_QUEUES:
+            return {'queue': OUTBOX_QUEUES[kind], 'priority': OUTBOX_PRIORITIES[kind]}
+        return {'queue': 'notifications'}
+    if name in TASK_QUEUES:
+        return {'queue': TASK_QUEUES[name]}
+    return None
+
+
+def outbox_schedule(kind):
+    # One poll per kind and interval; a poll still queued when the next one is due is dropped instead of piling up.
+    # Sending throughput is bounded by the batch size and the per-domain SMTP limits, not by a task rate limit,
+    # which Celery would share between the kinds served by the same worker.
+    return {
+        'task': 'tasks.deliver_outbox',
+        'schedule': Config.OUTBOX_POLL_INTERVAL,
+        'kwargs': {'kind': kind},
+        'options': {'expires': Config.OUTBOX_POLL_INTERVAL},
+    }
+
 
 def make_celery():
     celery = Celery(__name__)
     celery.conf.broker_url = Config.CELERY_BROKER_URL
     celery.conf.result_backend = Config.CELERY_RESULT_BACKEND
 
+    celery.conf.task_queues = [Queue(name, queue_arguments={'x-max-priority': 10}) for name in QUEUES]
+    # Imported by the worker before worker_init, so the metrics exporter (imported by tasks) is connected in time
+    celery.conf.imports = ('tasks',)
+    celery.conf.task_default_queue = 'default'
+    celery.conf.task_routes = (route_task,)
+    # acks_late tasks are long: a worker reserves one message at a time so the others stay available
+    celery.conf.worker_prefetch_multiplier = 1
+    celery.conf.broker_transport_options = {
+        'priority_steps': list(range(10)),
+        'sep': ':',
+        'queue_order_strategy': 'priority',
+    }
+
     celery.conf.beat_schedule = {
         'check-reminders-and-escalations': {
-            'task': 'tasks.run_delayed_workflow',
+            'task': 'tasks.dispatch_due_reminders',
             'schedule': 3600.0
         },
+        'deliver-escalation-emails': outbox_schedule('escalation'),
+        'deliver-notification-emails': outbox_schedule('notification'),
+        'deliver-reminder-emails': outbox_schedule('reminder'),
+        'rebuild-dashboard-stats': {
+            'task': 'tasks.rebuild_stats_task',
+            'schedule': 86400.0
+        },
+        'archive-validated-containers': {
+            'task': 'tasks.archive_validated_containers',
+            'schedule': 86400.0
+        },
     }
 
     return celery
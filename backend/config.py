@@ -1,28 +1,111 @@
 import os
 
+from sqlalchemy.engine import make_url
+
+
+def is_memory_database(database_uri):
+    url = make_url(database_uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(database_uri):
+    """Options du pool de connexions ; SQLite en mémoire n'utilise pas de QueuePool et les refuse."""
+    if is_memory_database(database_uri):
+        return {}
+    # Pool de connexions par processus : pool_size doit couvrir le nombre de threads de chaque worker
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your_secret_key')
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///your_database_name.db'
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///your_database_name.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
     # Celery configuration (utilisé pour les rappels et escalades)
     CELERY_BROKER_URL = 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
+    # Cache des lectures de conteneurs (Redis, avec repli sur un LRU en mémoire)
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1')
+    CACHE_TTL = 300
+    CACHE_LOCAL_MAXSIZE = 10000
+    # Le repli en mémoire n'est pas invalidé par les autres processus : durée de vie courte
+    CACHE_LOCAL_TTL = 5
+    CACHE_REDIS_RETRY_INTERVAL = 30
+
+    # Jetons d'accès signés (HMAC de l'uuid avec SECRET_KEY) et cache jeton -> conteneur
+    # Transition : les liens déjà envoyés portent l'uuid seul. À passer à false une fois ces liens périmés
+    ACCESS_TOKEN_ACCEPT_UNSIGNED = os.getenv('ACCESS_TOKEN_ACCEPT_UNSIGNED', 'true').lower() == 'true'
+    TOKEN_CACHE_TTL = 86400
+    TOKEN_CACHE_LOCAL_TTL = 300
+    TOKEN_CACHE_LOCAL_MAXSIZE = 100000
+
+    # Événements temps réel (Redis pub/sub exposé en Server-Sent Events)
+    EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+    EVENTS_KEEPALIVE_INTERVAL = 15
+    # Flux SSE ouverts simultanément par processus : chacun occupe un thread d'un worker gthread,
+    # une greenlet avec gunicorn_events.conf.py (voir gunicorn.conf.py)
+    EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 4))
+    # Au-delà, le navigateur se reconnecte après EVENTS_BUSY_RETRY_MS ; un flux est fermé après EVENTS_STREAM_LIFETIME s
+    EVENTS_BUSY_RETRY_MS = 30000
+    EVENTS_STREAM_LIFETIME = int(os.getenv('EVENTS_STREAM_LIFETIME', 300))
+
     # Configuration OAuth
     OAUTH_CLIENT_ID = os.environ.get('OAUTH_CLIENT_ID')
     OAUTH_CLIENT_SECRET = os.environ.get('OAUTH_CLIENT_SECRET')
     OAUTH_PROVIDER = "https://provider.example.com"
 
+    # Serveur de production (gunicorn, voir gunicorn.conf.py)
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 0))  # 0 : 2 * CPU + 1
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    WEB_WORKER_CLASS = os.getenv('WEB_WORKER_CLASS', 'gthread')
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 60))
+    WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', 5))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+
+    # Observabilité : requêtes SQL lentes journalisées, profilage par requête avec l'en-tête X-Profile: 1
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/form-api-profiles')
+    # Port des métriques d'un worker Celery (0 : désactivé), un port par worker sur un même hôte
+    METRICS_WORKER_PORT = int(os.getenv('METRICS_WORKER_PORT', 0))
+
     SWAGGER_URL = '/api/docs'
     API_URL = '/static/swagger.json'
 
-    # Configuration de mail
-    SMTP_SERVER = 'smtp.example.com'
-    SMTP_PORT = 587
-    SMTP_USERNAME = 'user@example.com'
-    SMTP_PASSWORD = 'password'
+    # Configuration de mail ('console' affiche les emails, 'smtp' les envoie)
+    EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'console')
+    SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.example.com')
+    SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+    SMTP_USERNAME = os.getenv('SMTP_USERNAME', 'user@example.com')
+    SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', 'password')
+    SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
+    SMTP_TIMEOUT = 30
+    SMTP_POOL_SIZE = 4
+    SMTP_MAX_MESSAGES_PER_CONNECTION = 100
     EMAIL_FROM = 'no-reply@example.com'
     REMINDER_DELAY_DAYS = 3
+    # Outbox : un lot de OUTBOX_BATCH_SIZE emails toutes les OUTBOX_POLL_INTERVAL secondes
+    OUTBOX_BATCH_SIZE = 200
+    OUTBOX_POLL_INTERVAL = 10.0
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_RETRY_DELAY = 60
+    # Emails par minute et par domaine destinataire (0 : illimité), ex. SMTP_DOMAIN_RATE_LIMITS="gmail.com=100,orange.fr=30"
+    SMTP_DOMAIN_RATE_LIMIT = int(os.getenv('SMTP_DOMAIN_RATE_LIMIT', 0))
+    SMTP_DOMAIN_RATE_LIMITS = {
+        domain.strip().lower(): int(limit)
+        for domain, limit in (item.split('=') for item in os.getenv('SMTP_DOMAIN_RATE_LIMITS', '').split(',') if item)
+    }
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/2')
     APP_URL = 'https://yourapp.com'
+    # Archivage : conteneurs validés depuis plus de ARCHIVE_AFTER_DAYS jours, déplacés par lots
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_BATCH_SIZE = 500
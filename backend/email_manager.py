@@ -1,6 +1,23 @@
+import logging
+import queue
 import smtplib
+import socket
+import time
+from contextlib import contextmanager
 from email.mime.text import MIMEText
+
+import redis
 from config import Config
+from metrics import email_send_timer
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, socket.timeout, ConnectionError)
+# Refusals that only concern one message; the session stays usable for the next ones
+MESSAGE_ERRORS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+RATE_LIMIT_WINDOW = 60
+
+rate_limit_redis = redis.Redis.from_url(Config.RATE_LIMIT_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
 
 
 class MailManager:
@@ -9,19 +26,177 @@ class MailManager:
         self.smtp_port = Config.SMTP_PORT
         self.smtp_username = Config.SMTP_USERNAME
         self.smtp_password = Config.SMTP_PASSWORD
+        self.smtp_use_tls = Config.SMTP_USE_TLS
+        self.smtp_timeout = Config.SMTP_TIMEOUT
+        self.max_messages_per_connection = Config.SMTP_MAX_MESSAGES_PER_CONNECTION
         self.email_form = Config.EMAIL_FROM
+        # Authenticated sessions kept open between sends
+        self._pool = queue.LifoQueue(maxsize=Config.SMTP_POOL_SIZE)
 
-    def send_email(self, to, subject, body, link=None):
+    def build_message(self, to, subject, body, link=None):
         message = MIMEText(f"{body}\n\nLien d'accès : {link}" if link else body)
         message["Subject"] = subject
         message["From"] = self.email_form
         message["To"] = to
+        return message
+
+    def send_email(self, to, subject, body, link=None):
+        with self._connection() as connection:
+            self._send(connection, to, self.build_message(to, subject, body, link))
+
+    def send_many(self, messages):
+        """Send dicts of send_email kwargs over pooled sessions; returns the (message, error) pairs that failed.
+
+        If the session is lost and cannot be reopened, the message being sent and every later one are returned
+        as failed; messages already sent are never reported.
+        """
+        failures = []
+        with self._connection() as connection:
+            for index, message in enumerate(messages):
+                try:
+                    self._send(connection, message["to"], self.build_message(**message))
+                except OSError as e:
+                    if connection.usable and isinstance(e, MESSAGE_ERRORS):
+                        failures.append((message, e))
+                        continue
+                    connection.close()
+                    failures.extend((unsent, e) for unsent in messages[index:])
+                    break
+        return failures
+
+    def close(self):
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            connection.close()
+
+    @contextmanager
+    def _connection(self):
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = SMTPConnection(self)
+        try:
+            yield connection
+        except BaseException:
+            connection.close()
+            raise
+        if not connection.usable:
+            return
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _send(self, connection, to, message):
+        with email_send_timer():
+            self._deliver(connection, to, message)
+
+    def _deliver(self, connection, to, message):
+        if connection.sent >= self.max_messages_per_connection:
+            connection.reconnect()
+        try:
+            connection.sendmail(self.email_form, to, message.as_string())
+        except smtplib.SMTPResponseException as e:
+            # 421: the server is closing the session (idle timeout, per-session limit)
+            if e.smtp_code != 421:
+                raise
+            connection.reconnect()
+            connection.sendmail(self.email_form, to, message.as_string())
+        except RECONNECT_ERRORS:
+            connection.reconnect()
+            connection.sendmail(self.email_form, to, message.as_string())
+
+
+class SMTPConnection:
+    """An authenticated SMTP session reused across messages by MailManager."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.server = None
+        self.sent = 0
+        self.usable = False
+        self.connect()
 
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            server.starttls()
-            server.login(self.smtp_username, self.smtp_password)
-            server.sendmail(self.email_form, to, message.as_string())
+    def connect(self):
+        manager = self.manager
+        self.server = smtplib.SMTP(manager.smtp_server, manager.smtp_port, timeout=manager.smtp_timeout)
+        if manager.smtp_use_tls:
+            self.server.starttls()
+        if manager.smtp_username:
+            self.server.login(manager.smtp_username, manager.smtp_password)
+        self.sent = 0
+        self.usable = True
+
+    def reconnect(self):
+        self.close()
+        self.connect()
+
+    def sendmail(self, from_addr, to, message):
+        self.server.sendmail(from_addr, to, message)
+        self.sent += 1
+
+    def close(self):
+        self.usable = False
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+
+def recipient_domain(address):
+    return address.rpartition('@')[2].lower()
+
+
+def domain_rate_limit(domain):
+    """Emails per minute allowed to domain, 0 for no limit."""
+    return Config.SMTP_DOMAIN_RATE_LIMITS.get(domain, Config.SMTP_DOMAIN_RATE_LIMIT)
+
+
+def reserve_domain_quota(wanted):
+    """Reserve sends in the current one-minute window, shared by every worker; wanted maps domain -> count.
+
+    Returns domain -> count that may be sent now. Without Redis each call may use a whole window's limit.
+    """
+    if not wanted:
+        return {}
+    window = int(time.time() // RATE_LIMIT_WINDOW)
+    try:
+        pipeline = rate_limit_redis.pipeline(transaction=False)
+        for domain, count in wanted.items():
+            key = f"smtp-rate:{domain}:{window}"
+            pipeline.incrby(key, count)
+            pipeline.expire(key, 2 * RATE_LIMIT_WINDOW)
+        totals = pipeline.execute()[::2]
+    except redis.RedisError as e:
+        logger.warning("SMTP rate limit counters unavailable, limiting per batch only: %s", e)
+        return {domain: min(count, domain_rate_limit(domain)) for domain, count in wanted.items()}
+    return {
+        domain: max(0, min(count, domain_rate_limit(domain) - (total - count)))
+        for (domain, count), total in zip(wanted.items(), totals)
+    }
+
+
+_mail_manager = None
+
+
+def get_mail_manager():
+    global _mail_manager
+    if _mail_manager is None:
+        _mail_manager = MailManager()
+    return _mail_manager
 
 
 def send_email(to, subject, body, link=None):
-    print(f"to {to}, subject {subject}, body {body}, link {link}")
\ No newline at end of file
+    if Config.EMAIL_BACKEND == 'smtp':
+        return get_mail_manager().send_email(to, subject, body, link)
+    print(f"to {to}, subject {subject}, body {body}, link {link}")
+
+
+def send_many(messages):
+    if Config.EMAIL_BACKEND == 'smtp':
+        return get_mail_manager().send_many(messages)
+    for message in messages:
+        send_email(**message)
+    return []
@@ -0,0 +1,102 @@
+import json
+import logging
+import threading
+import time
+
+import redis
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Publishing runs after commit in write requests: short timeouts so a hung Redis cannot stall them
+redis_client = redis.Redis.from_url(Config.EVENTS_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+# Subscriptions wait on the socket between messages, so only the connection attempt is bounded
+stream_client = redis.Redis.from_url(Config.EVENTS_REDIS_URL, socket_connect_timeout=0.5, health_check_interval=30)
+# Each open stream holds a worker thread for its whole lifetime
+stream_slots = threading.BoundedSemaphore(Config.EVENTS_MAX_STREAMS)
+
+
+def container_channel(container_id):
+    return f"form-container-events:{container_id}"
+
+
+def admin_channel(admin_id):
+    return f"admin-events:{admin_id}"
+
+
+TIMELINE_EVENT_TYPES = {
+    'FormContainer created': 'created',
+    'Response submitted': 'response_submitted',
+    'Unsubstantial response': 'unsubstantial',
+    'FormContainer validated': 'validated',
+    'Escalation sent': 'escalation',
+    'FormContainer closed': 'closed',
+    'Notification resent': 'notification_resent',
+}
+
+
+def timeline_event_type(event):
+    if event in TIMELINE_EVENT_TYPES:
+        return TIMELINE_EVENT_TYPES[event]
+    if event.startswith('Reminder '):
+        return 'reminder'
+    return 'other'
+
+
+def timeline_event(admin_id, form_container_id, event, details, timestamp, **extra):
+    return dict(
+        extra,
+        type='timeline',
+        container_id=form_container_id,
+        admin_id=admin_id,
+        event_type=timeline_event_type(event),
+        event=event,
+        details=details,
+        timestamp=timestamp.isoformat() if timestamp else None,
+    )
+
+
+def entry_event(entry, admin_id, **extra):
+    """Event for a TimelineEntry; build it before commit, while the entry's attributes are still loaded."""
+    return timeline_event(admin_id, entry.form_container_id, entry.event, entry.details, entry.timestamp, **extra)
+
+
+def publish_events(events):
+    """Publish events to their container channel and to the channel of the admin concerned.
+
+    Publishing is best effort: a Redis outage must never fail the write that produced the events.
+    """
+    if not events:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for event in events:
+            message = json.dumps(event)
+            if event.get('container_id'):
+                pipeline.publish(container_channel(event['container_id']), message)
+            if event.get('admin_id'):
+                pipeline.publish(admin_channel(event['admin_id']), message)
+        pipeline.execute()
+    except redis.RedisError as e:
+        logger.warning("Unable to publish %d container events: %s", len(events), e)
+
+
+def stream_events(channel):
+    """Yield Server-Sent Events for every message published on channel, with keep-alive comments in between.
+
+    The stream ends after EVENTS_STREAM_LIFETIME so stream slots rotate between clients; EventSource reconnects.
+    """
+    pubsub = stream_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel)
+    deadline = time.monotonic() + Config.EVENTS_STREAM_LIFETIME
+    try:
+        yield "retry: 5000\n\n"
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=Config.EVENTS_KEEPALIVE_INTERVAL)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = message['data'].decode()
+            yield f"event: {json.loads(data)['type']}\ndata: {data}\n\n"
+    finally:
+        pubsub.close()
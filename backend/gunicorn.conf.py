@@ -0,0 +1,18 @@
+# Production server: gunicorn -c gunicorn.conf.py app:app
+import multiprocessing
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count() * 2 + 1
+worker_class = Config.WEB_WORKER_CLASS
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT
+keepalive = Config.WEB_KEEPALIVE
+# Recycle workers periodically to bound memory growth; jitter avoids restarting them all at once
+max_requests = Config.WEB_MAX_REQUESTS
+max_requests_jitter = Config.WEB_MAX_REQUESTS // 10
+preload_app = False
+
+# Server-Sent Events (/events, /form-containers/<id>/events) hold a thread per open stream here, so each process
+# serves at most EVENTS_MAX_STREAMS of them. In production the proxy routes the event paths to the gevent server
+# of gunicorn_events.conf.py instead, where an open stream only costs a greenlet.
@@ -0,0 +1,15 @@
+# Event stream server: gunicorn -c gunicorn_events.conf.py app:app
+# The reverse proxy routes only /events and /form-containers/<id>/events here. gevent workers hold each open
+# stream in a greenlet instead of a thread, so one process keeps thousands of dashboards connected.
+import os
+
+# Read by Config when the workers import the app
+os.environ.setdefault('EVENTS_MAX_STREAMS', '1000')
+
+bind = os.getenv('EVENTS_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('EVENTS_WORKERS', 2))
+worker_class = 'gevent'
+worker_connections = int(os.getenv('EVENTS_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+preload_app = False
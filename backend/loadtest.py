@@ -0,0 +1,80 @@
+"""Concurrent HTTP load generator for comparing server setups.
+
+    python loadtest.py http://localhost:5000/form-containers/<access_token> --concurrency 64 --duration 30
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(urls, concurrency, duration):
+    """GET the urls round-robin from concurrency threads for duration seconds; returns latencies and error count."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        index = offset
+        while time.perf_counter() < deadline:
+            url = urls[index % len(urls)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=30)
+                if response.status_code >= 400:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def report(latencies, errors, duration):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    latencies, errors = run_load(args.urls, args.concurrency, args.duration)
+    for key, value in report(latencies, errors, args.duration).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
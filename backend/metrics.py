@@ -0,0 +1,176 @@
+"""Prometheus instrumentation for the API, the SQL layer, Celery tasks and email delivery.
+
+With several gunicorn/Celery processes, point PROMETHEUS_MULTIPROC_DIR at a shared empty directory
+so that /metrics aggregates the samples of every process on the host.
+
+Celery workers serve no /metrics: the main worker process exports the task and SMTP metrics on
+METRICS_WORKER_PORT. Its prefork children record them in PROMETHEUS_MULTIPROC_DIR, which each worker
+needs on its own (see celery_app.py).
+"""
+import cProfile
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from celery.signals import (before_task_publish, task_prerun, task_postrun, worker_init, worker_process_init,
+                            worker_process_shutdown)
+from flask import g, has_request_context, request, Response
+from prometheus_client import (CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest,
+                               multiprocess, REGISTRY, start_http_server)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+try:
+    # Sampling profiler, much lighter than cProfile on hot endpoints
+    from pyinstrument import Profiler
+except ImportError:
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', "HTTP request latency",
+                            ['method', 'endpoint', 'status'])
+REQUEST_SQL_QUERIES = Histogram('http_request_sql_queries', "SQL statements executed per HTTP request",
+                                ['endpoint'], buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200))
+REQUEST_SQL_TIME = Histogram('http_request_sql_seconds', "Time spent in SQL per HTTP request", ['endpoint'])
+SQL_QUERY_LATENCY = Histogram('sql_query_duration_seconds', "SQL statement latency")
+TASK_RUNTIME = Histogram('celery_task_duration_seconds', "Celery task runtime", ['task', 'state'])
+TASK_QUEUE_LAG = Histogram('celery_task_queue_lag_seconds', "Delay between task publication and execution",
+                           ['task'], buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600))
+EMAIL_SEND_LATENCY = Histogram('email_send_duration_seconds', "SMTP send latency per message")
+EMAILS_SENT = Counter('emails_sent_total', "Emails handed to the SMTP server")
+EMAIL_FAILURES = Counter('email_send_failures_total', "Emails the SMTP server refused")
+
+
+def init_app(app):
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def endpoint_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def start_request_metrics():
+    g.request_started_at = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    if Config.PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+        if Profiler is not None:
+            g.profiler = Profiler()
+            g.profiler.start()
+        else:
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+
+def record_request_metrics(response):
+    if 'request_started_at' not in g:
+        return response
+    endpoint = endpoint_label()
+    REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+        time.perf_counter() - g.request_started_at)
+    REQUEST_SQL_QUERIES.labels(endpoint).observe(g.sql_queries)
+    REQUEST_SQL_TIME.labels(endpoint).observe(g.sql_seconds)
+    if 'profiler' in g:
+        response.headers['X-Profile-File'] = save_profile(g.profiler)
+    return response
+
+
+def save_profile(profiler):
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(Config.PROFILE_DIR, f"{request.endpoint}-{time.time_ns()}")
+    if Profiler is not None:
+        profiler.stop()
+        path += '.html'
+        with open(path, 'w') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        path += '.prof'
+        profiler.dump_stats(path)
+    return path
+
+
+def metrics_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view():
+    return Response(generate_latest(metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started_at'].pop()
+    SQL_QUERY_LATENCY.observe(elapsed)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+    if elapsed * 1000 >= Config.SLOW_QUERY_THRESHOLD_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+
+@contextmanager
+def email_send_timer():
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EMAIL_FAILURES.inc()
+        raise
+    EMAIL_SEND_LATENCY.observe(time.perf_counter() - start)
+    EMAILS_SENT.inc()
+
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    task.request.metrics_started_at = time.perf_counter()
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at:
+        TASK_QUEUE_LAG.labels(task.name).observe(max(0.0, time.time() - published_at))
+
+
+@task_postrun.connect
+def record_task_runtime(task=None, state=None, **kwargs):
+    started_at = getattr(task.request, 'metrics_started_at', None)
+    if started_at is not None:
+        TASK_RUNTIME.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started_at)
+
+
+@worker_init.connect
+def start_worker_exporter(**kwargs):
+    # Runs in the main worker process, before the pool starts
+    if Config.METRICS_WORKER_PORT:
+        start_http_server(Config.METRICS_WORKER_PORT, registry=metrics_registry())
+
+
+@worker_process_init.connect
+def check_worker_process_metrics(**kwargs):
+    if Config.METRICS_WORKER_PORT and 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set: the metrics of worker process %s are not exported",
+                       os.getpid())
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -4,7 +4,12 @@ from extensions import db
 
 class FormContainer(db.Model):
     __tablename__ = 'form_containers'
-    __table_args__ = (db.Index('idx_form_container_access_token', 'access_token'), )
+    __table_args__ = (
+        db.Index('idx_form_container_access_token', 'access_token'),
+        db.Index('idx_form_container_created_at_id', 'created_at', 'id'),
+        db.Index('idx_form_container_next_reminder_at', 'next_reminder_at', 'id'),
+        db.Index('idx_form_container_validated_updated_at', 'validated', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     access_token = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
@@ -19,38 +24,53 @@ class FormContainer(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     reminder_delay = db.Column(db.Integer, nullable=True)
+    next_reminder_at = db.Column(db.DateTime, nullable=True)
+    last_reminder_sent = db.Column(db.DateTime, nullable=True)
+    reminder_count = db.Column(db.Integer, nullable=False, default=0)
+    # The latest form has been escalated or closed; cleared when a form is added and the reminder cycle restarts
+    escalated = db.Column(db.Boolean, nullable=False, default=False)
 
-    forms = db.relationship('Form', backref='form_container', lazy=True)
+    forms = db.relationship('Form', backref='form_container', lazy=True, order_by='Form.id')
     timeline = db.relationship('TimelineEntry', backref='form_container', lazy=True)
 
 
 class Form(db.Model):
     __tablename__ = 'forms'
+    __table_args__ = (db.Index('idx_form_status_container', 'status', 'form_container_id'), )
+
     id = db.Column(db.Integer, primary_key=True)
     form_container_id = db.Column(db.Integer, db.ForeignKey('form_containers.id'), nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('form_templates.id'), nullable=False)
     status = db.Column(db.String(50), nullable=False, default='open')
-    questions = db.relationship('Question', backref='form', lazy=True, cascade="all, delete-orphan")
+    template = db.relationship('FormTemplate', lazy=True)
     responses = db.relationship('Response', backref='form', lazy=True)
-    # TODO
-    # last_reminder_sent = db.Column(db.DateTime, nullable=True)
-    # reminder_count = db.Column(db.Integer, default=0)
-    # escalated = db.Column(db.Boolean, default=False)
 
     def __repr__(self):
         return f"<Form {self.id} for Container {self.form_container_id}>"
 
+class FormTemplate(db.Model):
+    """Immutable question set shared by every form created from the same questions; identified by its checksum."""
+    __tablename__ = 'form_templates'
+    id = db.Column(db.Integer, primary_key=True)
+    checksum = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    questions = db.relationship('Question', backref='template', lazy=True, order_by='Question.id',
+                                cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<FormTemplate {self.id}>"
+
 class Question(db.Model):
     __tablename__ = 'questions'
     id = db.Column(db.Integer, primary_key=True)
-    form_id = db.Column(db.Integer, db.ForeignKey('forms.id'), nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('form_templates.id'), nullable=False, index=True)
     label = db.Column(db.String(255), nullable=False)
     type = db.Column(db.String(50), nullable=False)
     options = db.Column(db.JSON, nullable=True)
     is_required = db.Column(db.Boolean, default=True)
-    response = db.Column(db.JSON, nullable=True)
 
     def __repr__(self):
-        return f"<Question {self.id} for Form {self.form_id}>"
+        return f"<Question {self.id} for FormTemplate {self.template_id}>"
 
 class Response(db.Model):
     __tablename__ = 'responses'
@@ -58,13 +78,103 @@ class Response(db.Model):
     form_id = db.Column(db.Integer, db.ForeignKey('forms.id'), nullable=False)
     responder_uid = db.Column(db.String(255), nullable=False)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
-    answers = db.Column(db.JSON, nullable=False)
+
+    answers = db.relationship('Answer', backref='response', lazy=True, order_by='Answer.question_id')
+
+
+class Answer(db.Model):
+    """One answer of a response; choice questions store the selected options, text questions the text."""
+    __tablename__ = 'answers'
+    __table_args__ = (db.UniqueConstraint('response_id', 'question_id', name='uq_answer_response_question'), )
+
+    id = db.Column(db.Integer, primary_key=True)
+    response_id = db.Column(db.Integer, db.ForeignKey('responses.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
+    value_text = db.Column(db.Text, nullable=True)
+    value_options = db.Column(db.JSON, nullable=True)
 
 
 class TimelineEntry(db.Model):
     __tablename__ = 'timeline_entries'
+    __table_args__ = (db.Index('idx_timeline_entry_container_timestamp', 'form_container_id', 'timestamp', 'id'), )
+
     id = db.Column(db.Integer, primary_key=True)
     form_container_id = db.Column(db.Integer, db.ForeignKey('form_containers.id'), nullable=False)
     event = db.Column(db.String(255), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     details = db.Column(db.Text, nullable=True)
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (db.Index('idx_email_outbox_status_kind_next_attempt', 'status', 'kind', 'next_attempt_at'), )
+
+    id = db.Column(db.Integer, primary_key=True)
+    form_container_id = db.Column(db.Integer, db.ForeignKey('form_containers.id'), nullable=True)
+    to = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    link = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    # notification, reminder or escalation: each kind is delivered from its own Celery queue
+    kind = db.Column(db.String(20), nullable=False, default='notification')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    # e.g. 'reminder:<container id>:<number>': a replayed task cannot queue the same email twice
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=True)
+
+    form_container = db.relationship('FormContainer')
+
+
+class ContainerSearch(db.Model):
+    """Text searched for each container: its own fields plus the answer texts. Full-text indexes are added in search.py."""
+    __tablename__ = 'container_search'
+
+    container_id = db.Column(db.Integer, db.ForeignKey('form_containers.id'), primary_key=True, autoincrement=False)
+    document = db.Column(db.Text, nullable=False, default='')
+
+
+class ArchivedContainer(db.Model):
+    """A validated container moved out of the hot tables by archive.py, with its forms, responses and timeline."""
+    __tablename__ = 'archived_form_containers'
+
+    # Same id as the original container
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    access_token = db.Column(db.String(36), unique=True, nullable=False)
+    initiated_by = db.Column(db.String(255), nullable=False)
+    reference = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # zlib-compressed JSON document, see archive.container_document
+    payload = db.Column(db.LargeBinary, nullable=False)
+    # What the container adds to the dashboard rollup, so rebuild_stats can count it without the payload
+    stats = db.Column(db.JSON, nullable=False)
+
+
+class ContainerStats(db.Model):
+    """Rollup of container activity per (initiated_by, reference), maintained incrementally by stats.py."""
+    __tablename__ = 'container_stats'
+    initiated_by = db.Column(db.String(255), primary_key=True)
+    reference = db.Column(db.String(255), primary_key=True, default='')
+    containers = db.Column(db.Integer, nullable=False, default=0)
+    forms_open = db.Column(db.Integer, nullable=False, default=0)
+    forms_answered = db.Column(db.Integer, nullable=False, default=0)
+    forms_unsubstantial = db.Column(db.Integer, nullable=False, default=0)
+    forms_validated = db.Column(db.Integer, nullable=False, default=0)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    responded_containers = db.Column(db.Integer, nullable=False, default=0)
+    reminders_sent = db.Column(db.Integer, nullable=False, default=0)
+    escalations = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AnswerTimeBucket(db.Model):
+    """Histogram of time-to-answer per (initiated_by, reference); bucket_hours is the bucket's upper bound."""
+    __tablename__ = 'container_stats_answer_times'
+    initiated_by = db.Column(db.String(255), primary_key=True)
+    reference = db.Column(db.String(255), primary_key=True, default='')
+    bucket_hours = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -1,10 +1,185 @@
-from flask import Blueprint, jsonify, request, session
-from models import db, FormContainer, Form, Question, TimelineEntry, Response
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+import uuid
+from flask import Blueprint, abort, jsonify, request, session, stream_with_context, Response as FlaskResponse
+from collections import Counter
+from functools import lru_cache
+from sqlalchemy import insert, select, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, raiseload
+from models import db, FormContainer, Form, FormTemplate, Question, TimelineEntry, Response, Answer, EmailOutbox, \
+    ContainerStats, AnswerTimeBucket, ArchivedContainer
 from datetime import datetime
-from tasks import run_delayed_workflow, send_initial_notification_task
+from config import Config
+from cache import cached_json_response, container_key, timeline_key, invalidate_container, cached_container_id, \
+    remember_container_id, forget_access_tokens
+from events import timeline_event_type, entry_event, publish_events, stream_events, container_channel, admin_channel, \
+    stream_slots
+import stats
+import bulk
+import archive
+import search
+from tokens import sign_access_token, verify_access_token
+from tasks import schedule_reminders, cancel_reminders, reminder_interval, initial_notification, bulk_action_task
 
 api = Blueprint('api', __name__)
 ADMIN_ID = 'd76476'  # todo enlever cette ligne et la remplcer par ADMIN_ID
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+TEMPLATE_CACHE_SIZE = 1024
+CHOICE_QUESTION_TYPES = ('multipleChoice', 'dropdown')
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+
+def validate_container_payload(data, recipients):
+    """Return an error message for an invalid creation payload, or None."""
+    if not isinstance(data, dict) or not data.get('title') or not data.get('description'):
+        return "Les champs 'title' et 'description' sont requis"
+    if any(not isinstance(recipient, dict) or not recipient.get('user_email') for recipient in recipients):
+        return "Le champ 'user_email' est requis pour chaque destinataire"
+    form_data = data.get('forms')
+    if not isinstance(form_data, dict) or not isinstance(form_data.get('questions'), list):
+        return "Un formulaire est requis pour créer un conteneur"
+    if any(not isinstance(question, dict) or not question.get('label') or not question.get('type')
+           for question in form_data['questions']):
+        return "Chaque question doit avoir un 'label' et un 'type'"
+    return None
+
+
+def question_definitions(questions_data):
+    return [
+        {
+            "label": question_data['label'],
+            "type": question_data['type'],
+            "options": question_data.get('options', []),
+            "is_required": question_data.get('isRequired', True)
+        }
+        for question_data in questions_data
+    ]
+
+
+def get_or_create_template(questions_data):
+    """Return the id of the template holding exactly these questions, creating it on first use."""
+    questions = question_definitions(questions_data)
+    checksum = hashlib.sha256(json.dumps(questions, sort_keys=True).encode()).hexdigest()
+    template_id = db.session.scalar(select(FormTemplate.id).where(FormTemplate.checksum == checksum))
+    if template_id:
+        return template_id
+    try:
+        with db.session.begin_nested():
+            template_id = db.session.scalar(insert(FormTemplate).values(checksum=checksum).returning(FormTemplate.id))
+            if questions:
+                db.session.execute(insert(Question), [dict(question, template_id=template_id) for question in questions])
+    except IntegrityError:
+        # Created concurrently by another request
+        template_id = db.session.scalar(select(FormTemplate.id).where(FormTemplate.checksum == checksum))
+    return template_id
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def template_questions(template_id):
+    """Serialized questions of a template; templates never change, so they are cached for the process lifetime."""
+    return tuple(
+        {
+            "id": question.id,
+            "label": question.label,
+            "type": question.type,
+            "options": question.options,
+            "is_required": question.is_required,
+        }
+        for question in db.session.execute(
+            select(Question.id, Question.label, Question.type, Question.options, Question.is_required)
+            .where(Question.template_id == template_id).order_by(Question.id)
+        )
+    )
+
+
+def create_form_containers(data, recipients, admin_id):
+    """Create one container per recipient from the same payload with set-based INSERTs, without committing."""
+    now = datetime.utcnow()
+    next_reminder_at = now + reminder_interval(data.get('reminder_delay_day'))
+    access_tokens = [str(uuid.uuid4()) for _ in recipients]
+    rows = [
+        {
+            "access_token": access_token,
+            "title": data['title'],
+            "description": data['description'],
+            "user_email": recipient['user_email'],
+            "manager_email": recipient.get('manager_email', data.get('manager_email')),
+            "reference": recipient.get('reference', data.get('reference')),
+            "escalate": data.get('escalate', False),
+            "initiated_by": admin_id,
+            "reminder_delay": data.get('reminder_delay_day'),
+            "created_at": now,
+            "updated_at": now,
+            "next_reminder_at": next_reminder_at,
+            "reminder_count": 0,
+        }
+        for recipient, access_token in zip(recipients, access_tokens)
+    ]
+    # RETURNING order is not guaranteed for multi-row inserts, so rows are matched back by access token / container id
+    container_ids = dict(db.session.execute(
+        insert(FormContainer).returning(FormContainer.access_token, FormContainer.id), rows
+    ).all())
+    search.index_containers([
+        {
+            "container_id": container_ids[row["access_token"]],
+            "document": search.container_text(row["title"], row["description"], row["reference"], row["user_email"],
+                                              row["manager_email"]),
+        }
+        for row in rows
+    ])
+    containers = [
+        {"container_id": container_ids[access_token], "access_token": access_token, "user_email": recipient['user_email']}
+        for recipient, access_token in zip(recipients, access_tokens)
+    ]
+    template_id = get_or_create_template(data['forms']['questions'])
+    form_ids = dict(db.session.execute(
+        insert(Form).returning(Form.form_container_id, Form.id),
+        [{"form_container_id": container["container_id"], "template_id": template_id} for container in containers]
+    ).all())
+    db.session.execute(insert(TimelineEntry), [
+        {
+            "form_container_id": container["container_id"],
+            "event": 'FormContainer created',
+            "details": f'Form container created with title {data["title"]} by {admin_id}',
+            "timestamp": now
+        }
+        for container in containers
+    ])
+    db.session.execute(insert(EmailOutbox), [
+        initial_notification(container["container_id"], container["user_email"], data['title'],
+                             sign_access_token(container["access_token"]))
+        for container in containers
+    ])
+    created_per_reference = Counter(recipient.get('reference', data.get('reference')) for recipient in recipients)
+    for reference, count in created_per_reference.items():
+        stats.record(admin_id, reference, containers=count, forms_open=count)
+    return [
+        {
+            "container_id": container["container_id"],
+            "form_id": form_ids[container["container_id"]],
+            "access_token": sign_access_token(container["access_token"])
+        }
+        for container in containers
+    ]
 
 
 @api.route('/form-containers', methods=['POST'])
@@ -15,52 +190,145 @@ def create_form_container():
     if not admin_id:
         return jsonify({"error": "SuperAdmin non authentifié"}), 401
 
-    form_container = FormContainer(
-        title=data['title'],
-        description=data['description'],
-        user_email=data['user_email'],
-        manager_email=data['manager_email'],
-        reference=data.get('reference'),
-        escalate=data.get('escalate', False),
-        initiated_by=admin_id,
-        reminder_delay=data.get('reminder_delay_day')
-    )
+    error = validate_container_payload(data, [data])
+    if error:
+        return jsonify({"error": error}), 400
 
-    db.session.add(form_container)
+    created = create_form_containers(data, [data], admin_id)
     db.session.commit()
+    publish_containers_created(created, admin_id)
 
-    form_data = data.get('forms')
-    if not form_data:
-        return jsonify({"error": "Un formulaire est requis pour créer un conteneur"}), 400
+    return jsonify(created[0]), 201
 
-    form = Form(form_container_id=form_container.id)
 
-    for question_data in form_data['questions']:
-        question = Question(
-            label=question_data['label'],
-            type=question_data['type'],
-            options=question_data.get('options', []),
-            is_required=question_data.get('isRequired', True)
-        )
-        form.questions.append(question)
+@api.route('/form-containers/bulk', methods=['POST'])
+def create_form_containers_bulk():
+    data = request.json
+    admin_id = ADMIN_ID
 
-    db.session.add(form)
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
 
-    timeline_entry = TimelineEntry(
-        form_container_id=form_container.id,
-        event='FormContainer created',
-        details=f'Form container created with title {form_container.title} by {admin_id}',
-        timestamp=datetime.utcnow()
-    )
-    db.session.add(timeline_entry)
+    recipients = data.get('recipients') if isinstance(data, dict) else None
+    if not recipients or not isinstance(recipients, list):
+        return jsonify({"error": "Au moins un destinataire est requis"}), 400
+    error = validate_container_payload(data, recipients)
+    if error:
+        return jsonify({"error": error}), 400
 
+    created = create_form_containers(data, recipients, admin_id)
     db.session.commit()
-    send_initial_notification_task(form_container.id)
-    # TODO
-    #run_delayed_workflow(container_id=form_container.id)
+    publish_containers_created(created, admin_id)
+
+    return jsonify(created), 201
+
+
+@api.route('/form-containers/bulk-actions', methods=['POST'])
+def run_bulk_action():
+    """Apply validate/close/resend to a list of container ids or to every container matching filters.
+
+    Small batches run in the request; larger ones are queued as a chunked Celery job whose progress is polled
+    on GET /form-containers/bulk-actions/<job_id>.
+    """
+    data = request.json or {}
+    admin_id = ADMIN_ID
+
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
+
+    action = data.get('action')
+    if action not in bulk.BULK_ACTIONS:
+        return jsonify({"error": f"Action non valide ({', '.join(bulk.BULK_ACTIONS)})"}), 400
+    container_ids = data.get('container_ids')
+    filters = {key: value for key, value in (data.get('filters') or {}).items() if key in bulk.BULK_FILTERS and value}
+    if container_ids is not None:
+        if not isinstance(container_ids, list) or not all(isinstance(container_id, int) for container_id in container_ids):
+            return jsonify({"error": "'container_ids' doit être une liste d'identifiants"}), 400
+        filters = None
+    elif not filters:
+        # An empty filter would select every container
+        return jsonify({"error": "'container_ids' ou au moins un filtre est requis"}), 400
+
+    try:
+        total = bulk.count_containers(container_ids, filters)
+    except ValueError:
+        return jsonify({"error": "Date invalide, format ISO 8601 attendu"}), 400
+
+    if total <= bulk.BULK_SYNC_LIMIT:
+        return jsonify(dict(bulk.run_bulk_action(action, admin_id, container_ids, filters), total=total)), 200
+
+    job = bulk_action_task.delay(action, admin_id, container_ids, filters)
+    return jsonify({"job_id": job.id, "action": action, "total": total}), 202
+
+
+@api.route('/form-containers/bulk-actions/<string:job_id>', methods=['GET'])
+def get_bulk_action_status(job_id):
+    job = bulk_action_task.AsyncResult(job_id)
+    result = {"job_id": job_id, "state": job.state}
+    if job.state == 'PROGRESS':
+        result.update(job.info)
+    elif job.state == 'SUCCESS':
+        result.update(job.result)
+    elif job.state == 'FAILURE':
+        result["error"] = str(job.result)
+    return jsonify(result), 200
+
+
+@api.route('/stats', methods=['GET'])
+def get_stats():
+    admin_id = ADMIN_ID
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
+
+    # Reads only the rollup tables, never the containers themselves
+    query = ContainerStats.query
+    buckets_query = AnswerTimeBucket.query
+    for column in ('initiated_by', 'reference'):
+        if column in request.args:
+            query = query.filter_by(**{column: request.args[column]})
+            buckets_query = buckets_query.filter_by(**{column: request.args[column]})
+
+    buckets = {}
+    for bucket in buckets_query:
+        buckets.setdefault((bucket.initiated_by, bucket.reference), {})[bucket.bucket_hours] = bucket.count
+    return jsonify([
+        stats.serialize_stats(row, buckets.get((row.initiated_by, row.reference), {})) for row in query
+    ]), 200
+
+
+def publish_containers_created(created, admin_id):
+    publish_events([{
+        "type": 'containers_created',
+        "admin_id": admin_id,
+        "container_ids": [container["container_id"] for container in created]
+    }])
+
+
+@api.route('/form-containers/<int:container_id>/events', methods=['GET'])
+def stream_form_container_events(container_id):
+    if not db.session.query(FormContainer.id).filter_by(id=container_id).first():
+        return jsonify({"error": "Form Container introuvable"}), 404
+    return event_stream_response(container_channel(container_id))
+
+
+@api.route('/events', methods=['GET'])
+def stream_admin_events():
+    admin_id = ADMIN_ID
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
+    return event_stream_response(admin_channel(admin_id))
+
+
+def event_stream_response(channel):
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    # Streams are capped per process so they cannot take every thread away from the API. A client over the cap gets
+    # an empty stream telling EventSource to reconnect later (a non-200 answer would stop it for good)
+    if not stream_slots.acquire(blocking=False):
+        return FlaskResponse(f"retry: {Config.EVENTS_BUSY_RETRY_MS}\n\n", mimetype='text/event-stream', headers=headers)
+    response = FlaskResponse(stream_events(channel), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(stream_slots.release)
+    return response
 
-    return jsonify(
-        {"container_id": form_container.id, "form_id": form.id, "access_token": form_container.access_token}), 201
 
 @api.route('/form-containers/<int:container_id>/forms', methods=['POST'])
 def add_form_to_container(container_id):
@@ -76,14 +344,14 @@ def add_form_to_container(container_id):
 
     if current_form:
         current_form.status = 'unsubstantial'
+        stats.record_status_change(form_container, 'answered', 'unsubstantial')
+    stats.record_status_change(form_container, None, 'open')
 
     data = request.json
     questions_data = data.get('questions', [])
-    questions = [Question(label=question['label'], type=question['type'], options=question.get('options', []),
-                          is_required=question.get('isRequired', True)) for question in questions_data]
     new_form = Form(
         form_container_id=container_id,
-        questions=questions
+        template_id=get_or_create_template(questions_data)
     )
 
     timeline_entry = TimelineEntry(
@@ -94,9 +362,14 @@ def add_form_to_container(container_id):
     )
     db.session.add(new_form)
     db.session.add(timeline_entry)
+    schedule_reminders(form_container)
+    event = entry_event(timeline_entry, form_container.initiated_by, status='open')
 
     try:
         db.session.commit()
+        invalidate_container(form_container.access_token, form_container.id)
+        event['form_id'] = new_form.id
+        publish_events([event])
         return jsonify({"form_id": new_form.id}), 201
     except Exception as e:
         db.session.rollback()
@@ -104,36 +377,92 @@ def add_form_to_container(container_id):
 
 
 
+def answer_row(question, value):
+    """Typed column values for an answer to question, or an error message if value does not fit the question."""
+    options = question["options"] or []
+    if question["type"] == 'checkbox':
+        if not isinstance(value, list) or not all(isinstance(option, str) for option in value):
+            return None, "Une liste d'options est attendue"
+        if options and any(option not in options for option in value):
+            return None, "Option inconnue"
+        return {"value_options": value}, None
+    if not isinstance(value, str):
+        return None, "Une réponse texte est attendue"
+    if question["type"] in CHOICE_QUESTION_TYPES and options and value not in options:
+        return None, "Option inconnue"
+    return {"value_text": value}, None
+
+
+def answer_value(answer):
+    return answer.value_options if answer.value_options is not None else answer.value_text
+
+
+def validate_answers(template_id, submitted):
+    """Check the submitted answers against the template's questions in one pass.
+
+    Returns the Answer rows to insert (without response_id), the unknown question ids and the invalid answers.
+    """
+    questions = {question["id"]: question for question in template_questions(template_id)}
+    rows, unknown_ids, invalid, seen = [], [], [], set()
+    for question_data in submitted:
+        question_id, value = question_data.get('id'), question_data.get('response')
+        question = questions.get(question_id)
+        if question is None:
+            unknown_ids.append(question_id)
+            continue
+        if question_id in seen:
+            invalid.append({"question_id": question_id, "error": "Question répondue plusieurs fois"})
+            continue
+        seen.add(question_id)
+        if value is None or value == '' or value == []:
+            continue
+        row, error = answer_row(question, value)
+        if error:
+            invalid.append({"question_id": question_id, "error": error})
+        else:
+            rows.append(dict(row, question_id=question_id))
+    return rows, unknown_ids, invalid
+
+
 @api.route('/form-containers/<string:access_token>/forms/<int:form_id>/submit-response', methods=['POST'])
 def submit_form_response(access_token, form_id):
     data = request.json
     responder_uid = ADMIN_ID
 
-    form_container = FormContainer.query.filter_by(access_token=access_token).first_or_404()
+    access_token = verify_access_token(access_token)
+    form_container = load_container(access_token) if access_token else None
+    if form_container is None:
+        abort(404)
     if form_container.validated:
         return jsonify({"error": "Form container already validated"}), 401
 
     form = Form.query.filter_by(id=form_id, form_container_id=form_container.id).first_or_404()
     if form.status =='answered':
         return jsonify({"error": "Form already answered"}), 401
+    answers, unknown_ids, invalid_answers = validate_answers(form.template_id, data.get('questions', []))
+    if unknown_ids:
+        return jsonify({"error": "Questions inconnues pour ce formulaire", "unknown_question_ids": unknown_ids}), 400
+    if invalid_answers:
+        return jsonify({"error": "Réponses invalides", "invalid_answers": invalid_answers}), 400
+
+    first_response = not db.session.query(Response.id).join(Form).filter(
+        Form.form_container_id == form_container.id
+    ).first()
+    submitted_at = datetime.utcnow()
     response_record = Response(
         form_id=form.id,
         responder_uid=responder_uid,
-        answers=[]
+        submitted_at=submitted_at
     )
-
-    for question_data in data.get('questions', []):
-        question_id = question_data.get('id')
-        response_content = question_data.get('response')
-        question = Question.query.filter_by(id=question_id, form_id=form.id).first_or_404()
-        question.response = response_content
-        response_record.answers.append({
-            "questionId": question.id,
-            "response": response_content
-        })
-
-    form.responses.append(response_record)
+    db.session.add(response_record)
+    db.session.flush()
+    if answers:
+        db.session.execute(insert(Answer), [dict(answer, response_id=response_record.id) for answer in answers])
+        search.index_answers(form_container.id, answers)
+    stats.record_status_change(form_container, form.status, 'answered')
+    stats.record_answer(form_container, submitted_at, first_response)
     form.status = 'answered'
+    cancel_reminders(form_container)
 
     timeline_entry = TimelineEntry(
         form_container_id=form_container.id,
@@ -142,9 +471,10 @@ def submit_form_response(access_token, form_id):
         timestamp=datetime.utcnow()
     )
     db.session.add(timeline_entry)
+    event = entry_event(timeline_entry, form_container.initiated_by, form_id=form_id, status='answered')
     db.session.commit()
-    form_workflow = FormWorkflowManager(container_id=form_container.id)
-    # form_workflow.stop_workflow()
+    invalidate_container(form_container.access_token, form_container.id)
+    publish_events([event])
     return jsonify({"message": "Réponse soumise avec succès"}), 200
 
 
@@ -162,10 +492,39 @@ def get_form_containers():
         if not status:
             return jsonify({"error": "Le paramètre 'status' est requis"}), 400
 
-        form_containers = FormContainer.query.join(Form).filter(Form.status == status).all()
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError:
+            return jsonify({"error": "Paramètres de pagination invalides"}), 400
+        if limit < 1:
+            return jsonify({"error": "Paramètres de pagination invalides"}), 400
+
+        # Column-only projection with EXISTS so each container appears once, whatever its number of forms
+        query = db.session.query(
+            FormContainer.id,
+            FormContainer.access_token,
+            FormContainer.title,
+            FormContainer.description,
+            FormContainer.created_at,
+            FormContainer.user_email,
+            FormContainer.manager_email,
+            FormContainer.reference,
+        ).filter(
+            db.exists().where(Form.form_container_id == FormContainer.id, Form.status == status)
+        )
+        if cursor:
+            created_at, container_id = cursor
+            query = query.filter(or_(
+                FormContainer.created_at < created_at,
+                and_(FormContainer.created_at == created_at, FormContainer.id < container_id)
+            ))
+        rows = query.order_by(FormContainer.created_at.desc(), FormContainer.id.desc()).limit(limit + 1).all()
+
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
         result = [
             {
-                "access_token": fc.access_token,
+                "access_token": sign_access_token(fc.access_token),
                 "title": fc.title,
                 "description": fc.description,
                 "created_at": fc.created_at,
@@ -173,18 +532,138 @@ def get_form_containers():
                 "manager_email": fc.manager_email,
                 "reference": fc.reference,
             }
-            for fc in form_containers
+            for fc in rows[:limit]
         ]
     else:
         return jsonify({"error": "Type de requête non valide"}), 400
 
+    response = jsonify(result)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+
+@api.route('/form-containers/search', methods=['GET'])
+def search_form_containers():
+    """Full-text search (q) with substring filters on emails/reference, exact filters and facet counts."""
+    admin_id = ADMIN_ID
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
+
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+    if limit < 1:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+    escalated = request.args.get('escalated')
+    if escalated not in (None, 'true', 'false'):
+        return jsonify({"error": "Le paramètre 'escalated' doit valoir true ou false"}), 400
+
+    conditions = search.search_conditions(
+        query=request.args.get('q'),
+        email=request.args.get('email'),
+        reference=request.args.get('reference'),
+        status=request.args.get('status'),
+        initiated_by=request.args.get('initiated_by'),
+        escalated=None if escalated is None else escalated == 'true',
+    )
+    query = db.session.query(
+        FormContainer.id,
+        FormContainer.access_token,
+        FormContainer.title,
+        FormContainer.description,
+        FormContainer.created_at,
+        FormContainer.user_email,
+        FormContainer.manager_email,
+        FormContainer.reference,
+        FormContainer.initiated_by,
+        FormContainer.validated,
+        FormContainer.escalated,
+    ).filter(*conditions)
+    if cursor:
+        created_at, container_id = cursor
+        query = query.filter(or_(
+            FormContainer.created_at < created_at,
+            and_(FormContainer.created_at == created_at, FormContainer.id < container_id)
+        ))
+    rows = query.order_by(FormContainer.created_at.desc(), FormContainer.id.desc()).limit(limit + 1).all()
+
+    result = {
+        "results": [
+            {
+                "id": fc.id,
+                "access_token": sign_access_token(fc.access_token),
+                "title": fc.title,
+                "description": fc.description,
+                "created_at": fc.created_at,
+                "user_email": fc.user_email,
+                "manager_email": fc.manager_email,
+                "reference": fc.reference,
+                "initiated_by": fc.initiated_by,
+                "validated": fc.validated,
+                "escalated": fc.escalated,
+            }
+            for fc in rows[:limit]
+        ],
+        "next_cursor": encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None,
+    }
+    # Facets describe the whole result set, so they are only computed for the first page
+    if not cursor and request.args.get('facets', 'true') != 'false':
+        result["facets"] = search.facet_counts(conditions)
     return jsonify(result), 200
 
 
+def load_container(access_token, *options):
+    """Hot container for a verified access token, found by primary key when the token cache knows its id."""
+    query = FormContainer.query.options(*options)
+    container_id = cached_container_id(access_token)
+    if container_id is not None:
+        return query.filter_by(id=container_id).first()
+    form_container = query.filter_by(access_token=access_token).first()
+    if form_container is not None:
+        remember_container_id(access_token, form_container.id)
+    return form_container
+
+
 @api.route('/form-containers/<string:access_token>', methods=['GET'])
 def get_form_container_by_access_token(access_token):
-    form_container = FormContainer.query.filter_by(access_token=access_token).first_or_404()
-    result = {
+    # Forged or guessed tokens are turned away before any cache or database lookup
+    access_token = verify_access_token(access_token)
+    if access_token is None:
+        abort(404)
+    return cached_json_response(container_key(access_token), lambda: serialize_form_container(access_token))
+
+
+def serialize_form_container(access_token):
+    # Load the whole container tree up front (one SELECT per level); raiseload turns any new lazy load into an error
+    form_container = load_container(
+        access_token,
+        selectinload(FormContainer.forms).selectinload(Form.responses),
+        raiseload('*'),
+    )
+    if form_container is None:
+        # Archived containers are rebuilt from their archive document; the body is then cached like any other
+        archived = ArchivedContainer.query.filter_by(access_token=access_token).first_or_404()
+        return render_form_container(*archive.rehydrate(archived))
+
+    # Only the latest response of each form is shown, so only its answers are loaded
+    latest_responses = [
+        max(form.responses, key=lambda response: response.id) for form in form_container.forms if form.responses
+    ]
+    answers = {}
+    if latest_responses:
+        for answer in db.session.execute(
+            select(Answer.response_id, Answer.question_id, Answer.value_text, Answer.value_options)
+            .where(Answer.response_id.in_([response.id for response in latest_responses]))
+        ):
+            answers.setdefault(answer.response_id, {})[answer.question_id] = answer_value(answer)
+    return render_form_container(form_container, answers)
+
+
+def render_form_container(form_container, answers):
+    return {
         "id": form_container.id,
         "title": form_container.title,
         "description": form_container.description,
@@ -194,34 +673,29 @@ def get_form_container_by_access_token(access_token):
         "escalate": form_container.escalate,
         "validated": form_container.validated,
         "initiated_by": form_container.initiated_by,
-        "forms": [
+        "forms": [serialize_form(form, answers) for form in form_container.forms]
+    }
+
+
+def serialize_form(form, answers):
+    # Questions come from the shared template; each one carries the answer of the form's latest response
+    latest = max(form.responses, key=lambda response: response.id, default=None)
+    answers = answers.get(latest.id, {}) if latest else {}
+    return {
+        "form_id": form.id,
+        "status": form.status,
+        "questions": [
+            dict(question, response=answers.get(question["id"]))
+            for question in template_questions(form.template_id)
+        ],
+        "responses": [
             {
-                "form_id": form.id,
-                "status": form.status,
-                "questions": [
-                    {
-                        "id": question.id,
-                        "label": question.label,
-                        "type": question.type,
-                        "options": question.options,
-                        "is_required": question.is_required,
-                        "response": getattr(question, 'response', None)
-                    }
-                    for question in form.questions
-                ],
-                "responses": [
-                    {
-                        "responder_uid": response.responder_uid,
-                        "submitted_at": response.submitted_at,
-                        "answers": response.answers
-                    }
-                    for response in form.responses
-                ]
+                "responder_uid": response.responder_uid,
+                "submitted_at": response.submitted_at
             }
-            for form in form_container.forms
+            for response in form.responses
         ]
     }
-    return jsonify(result), 200
 
 
 @api.route('/form-containers/<int:container_id>/forms/<int:form_id>/validate', methods=['POST'])
@@ -239,7 +713,9 @@ def validate_form_container(container_id, form_id):
         return jsonify({"error": "Formulaire introuvable"}), 404
 
     form_container.validated = True
+    stats.record_status_change(form_container, form.status, 'validated')
     form.status = 'validated'
+    cancel_reminders(form_container)
 
     timeline_entry = TimelineEntry(
         form_container_id=form_container.id,
@@ -248,25 +724,179 @@ def validate_form_container(container_id, form_id):
         timestamp=datetime.utcnow()
     )
     db.session.add(timeline_entry)
+    event = entry_event(timeline_entry, form_container.initiated_by, form_id=form_id, status='validated')
 
     db.session.commit()
+    invalidate_container(form_container.access_token, form_container.id)
+    forget_access_tokens([form_container.access_token])
+    publish_events([event])
 
     return jsonify({"message": "Formulaire validé avec succès."}), 200
 
 
-@api.route('/form-containers/<string:form_container_id>/timeline', methods=['GET'])
+@api.route('/form-containers/<int:form_container_id>/timeline', methods=['GET'])
 def get_form_container_timeline(form_container_id):
-    timeline_entry = TimelineEntry.query.filter_by(form_container_id=form_container_id).all()
-    if not timeline_entry:
-        return jsonify({"error": "Timeline not found"}), 404
+    if 'since' not in request.args and 'limit' not in request.args:
+        # Only the default first page is cached; incremental reads are cheap index range scans
+        return cached_json_response(timeline_key(form_container_id),
+                                    lambda: serialize_form_container_timeline(form_container_id, None, DEFAULT_PAGE_SIZE))
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        since = decode_cursor(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+    if limit < 1:
+        return jsonify({"error": "Paramètres de pagination invalides"}), 400
+
+    result = serialize_form_container_timeline(form_container_id, since, limit)
+    if isinstance(result, tuple):
+        return result
+    return jsonify(result), 200
 
-    interaction_timeline = [
-        {
-            "form_container_id": te.form_container_id,
-            "event": te.event,
-            "details": te.details,
-            "timestamp": te.timestamp
-        }
-        for te in timeline_entry
-    ]
-    return jsonify(interaction_timeline), 200
+
+def serialize_form_container_timeline(form_container_id, since, limit):
+    """Entries after the since cursor, oldest first; next_cursor is what the client sends back as since."""
+    query = db.session.query(
+        TimelineEntry.id,
+        TimelineEntry.form_container_id,
+        TimelineEntry.event,
+        TimelineEntry.details,
+        TimelineEntry.timestamp,
+    ).filter(TimelineEntry.form_container_id == form_container_id)
+    if since:
+        timestamp, entry_id = since
+        query = query.filter(or_(
+            TimelineEntry.timestamp > timestamp,
+            and_(TimelineEntry.timestamp == timestamp, TimelineEntry.id > entry_id)
+        ))
+    rows = query.order_by(TimelineEntry.timestamp, TimelineEntry.id).limit(limit + 1).all()
+
+    if not rows:
+        archived = db.session.get(ArchivedContainer, form_container_id)
+        if archived is not None:
+            rows = archive.timeline_page(archived, since, limit + 1)
+        elif not since and not db.session.query(FormContainer.id).filter_by(id=form_container_id).first():
+            return jsonify({"error": "Timeline not found"}), 404
+
+    entries = rows[:limit]
+    if entries:
+        next_cursor = encode_cursor(entries[-1].timestamp, entries[-1].id)
+    else:
+        next_cursor = request.args.get('since')
+    return {
+        "entries": [
+            {
+                "id": te.id,
+                "form_container_id": te.form_container_id,
+                "type": timeline_event_type(te.event),
+                "event": te.event,
+                "details": te.details,
+                "timestamp": te.timestamp.isoformat()
+            }
+            for te in entries
+        ],
+        "next_cursor": next_cursor,
+        "has_more": len(rows) > limit
+    }
+
+
+@api.route('/responses/export', methods=['GET'])
+def export_responses():
+    admin_id = ADMIN_ID
+    if not admin_id:
+        return jsonify({"error": "SuperAdmin non authentifié"}), 401
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"error": "Format d'export non valide (ndjson ou csv)"}), 400
+
+    query = select(
+        Response.id,
+        Response.form_id,
+        Response.responder_uid,
+        Response.submitted_at,
+        FormContainer.id.label('container_id'),
+        FormContainer.reference,
+        FormContainer.initiated_by,
+    ).join(Form, Response.form_id == Form.id).join(FormContainer, Form.form_container_id == FormContainer.id)
+
+    if request.args.get('container_id'):
+        try:
+            container_id = int(request.args['container_id'])
+        except ValueError:
+            return jsonify({"error": "Identifiant de conteneur invalide"}), 400
+        query = query.where(FormContainer.id == container_id)
+    if request.args.get('reference'):
+        query = query.where(FormContainer.reference == request.args['reference'])
+    if request.args.get('initiated_by'):
+        query = query.where(FormContainer.initiated_by == request.args['initiated_by'])
+    try:
+        if request.args.get('submitted_from'):
+            query = query.where(Response.submitted_at >= datetime.fromisoformat(request.args['submitted_from']))
+        if request.args.get('submitted_to'):
+            query = query.where(Response.submitted_at < datetime.fromisoformat(request.args['submitted_to']))
+    except ValueError:
+        return jsonify({"error": "Date invalide, format ISO 8601 attendu"}), 400
+
+    query = query.order_by(Response.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    rows = stream_export_rows(query)
+    if export_format == 'csv':
+        return FlaskResponse(stream_with_context(export_csv(rows)), mimetype='text/csv',
+                              headers={'Content-Disposition': 'attachment; filename=responses.csv'})
+    return FlaskResponse(stream_with_context(export_ndjson(rows)), mimetype='application/x-ndjson')
+
+
+def stream_export_rows(query):
+    """Yield (row, answers with labels) using a server-side cursor, loading the answers once per batch."""
+    for batch in db.session.execute(query).partitions():
+        answers = {}
+        for answer in db.session.execute(
+            select(Answer.response_id, Answer.question_id, Question.label, Answer.value_text, Answer.value_options)
+            .join(Question, Answer.question_id == Question.id)
+            .where(Answer.response_id.in_([row.id for row in batch]))
+            .order_by(Answer.response_id, Answer.question_id)
+        ):
+            answers.setdefault(answer.response_id, []).append({
+                "question_id": answer.question_id,
+                "label": answer.label,
+                "response": answer_value(answer),
+            })
+        for row in batch:
+            yield row, answers.get(row.id, [])
+
+
+def export_ndjson(rows):
+    for row, answers in rows:
+        yield json.dumps({
+            "response_id": row.id,
+            "container_id": row.container_id,
+            "form_id": row.form_id,
+            "reference": row.reference,
+            "initiated_by": row.initiated_by,
+            "responder_uid": row.responder_uid,
+            "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+            "answers": answers,
+        }) + "\n"
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["response_id", "container_id", "form_id", "reference", "initiated_by", "responder_uid",
+                     "submitted_at", "question_id", "question_label", "response"])
+    # The header goes out on its own so an export without matching responses is still a valid CSV
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row, answers in rows:
+        for answer in answers:
+            response = answer["response"]
+            writer.writerow([
+                row.id, row.container_id, row.form_id, row.reference, row.initiated_by, row.responder_uid,
+                row.submitted_at.isoformat() if row.submitted_at else None,
+                answer["question_id"], answer["label"],
+                response if isinstance(response, str) else json.dumps(response),
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
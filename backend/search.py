@@ -0,0 +1,178 @@
+"""Full-text search over containers and their answers.
+
+Each container has a container_search row holding its searchable text; the write paths keep it current.
+The full-text index itself depends on the database:
+- SQLite: an FTS5 external-content table kept in sync with container_search by triggers
+- PostgreSQL: a generated tsvector column with a GIN index, plus trigram indexes for email/reference substrings
+"""
+import re
+
+from sqlalchemy import DDL, Integer, delete, event, func, insert, select, text, update
+from models import db, FormContainer, Form, Response, Answer, ContainerSearch
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE container_search_fts USING fts5("
+    "document, content='container_search', content_rowid='container_id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER container_search_ai AFTER INSERT ON container_search BEGIN "
+    "INSERT INTO container_search_fts(rowid, document) VALUES (new.container_id, new.document); END",
+    "CREATE TRIGGER container_search_ad AFTER DELETE ON container_search BEGIN "
+    "INSERT INTO container_search_fts(container_search_fts, rowid, document) "
+    "VALUES ('delete', old.container_id, old.document); END",
+    "CREATE TRIGGER container_search_au AFTER UPDATE ON container_search BEGIN "
+    "INSERT INTO container_search_fts(container_search_fts, rowid, document) "
+    "VALUES ('delete', old.container_id, old.document); "
+    "INSERT INTO container_search_fts(rowid, document) VALUES (new.container_id, new.document); END",
+]
+POSTGRESQL_DDL = [
+    "ALTER TABLE container_search ADD COLUMN document_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', document)) STORED",
+    "CREATE INDEX idx_container_search_document_tsv ON container_search USING gin (document_tsv)",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX idx_form_container_user_email_trgm ON form_containers USING gin (user_email gin_trgm_ops)",
+    "CREATE INDEX idx_form_container_reference_trgm ON form_containers USING gin (reference gin_trgm_ops)",
+]
+for statement in SQLITE_DDL:
+    event.listen(ContainerSearch.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_DDL:
+    event.listen(ContainerSearch.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+event.listen(ContainerSearch.__table__, 'before_drop',
+             DDL("DROP TABLE IF EXISTS container_search_fts").execute_if(dialect='sqlite'))
+
+REINDEX_BATCH_SIZE = 1000
+
+
+def container_text(title, description, reference, user_email, manager_email):
+    return ' '.join(value for value in (title, description, reference, user_email, manager_email) if value)
+
+
+def answers_text(answers):
+    """Searchable text of Answer rows given as dicts (value_text / value_options)."""
+    values = []
+    for answer in answers:
+        if answer.get('value_text'):
+            values.append(answer['value_text'])
+        values.extend(answer.get('value_options') or [])
+    return ' '.join(values)
+
+
+def index_containers(documents):
+    """Index new containers; documents are dicts of container_id and document."""
+    if documents:
+        db.session.execute(insert(ContainerSearch), documents)
+
+
+def index_answers(container_id, answers):
+    """Append the text of newly submitted answers to the container's document."""
+    content = answers_text(answers)
+    if content:
+        db.session.execute(
+            update(ContainerSearch).where(ContainerSearch.container_id == container_id)
+            .values(document=ContainerSearch.document + ' ' + content)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def unindex_containers(container_ids):
+    db.session.execute(
+        delete(ContainerSearch).where(ContainerSearch.container_id.in_(container_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def query_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def matching_container_ids(query):
+    """SELECT of the ids of containers whose document contains every term of query (as a prefix)."""
+    terms = query_terms(query)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return text(
+            "SELECT rowid FROM container_search_fts WHERE container_search_fts MATCH :match"
+        ).bindparams(match=' AND '.join(f'"{term}"*' for term in terms)).columns(rowid=Integer)
+    if dialect == 'postgresql':
+        return select(ContainerSearch.container_id).where(
+            text("document_tsv @@ to_tsquery('simple', :tsquery)").bindparams(
+                tsquery=' & '.join(f'{term}:*' for term in terms)
+            )
+        )
+    # Unindexed fallback for other databases
+    return select(ContainerSearch.container_id).where(
+        *[ContainerSearch.document.ilike(f'%{term}%') for term in terms]
+    )
+
+
+def search_conditions(query=None, email=None, reference=None, status=None, initiated_by=None, escalated=None):
+    """WHERE clauses on FormContainer for the search parameters that are set."""
+    conditions = []
+    if query and query_terms(query):
+        conditions.append(FormContainer.id.in_(matching_container_ids(query)))
+    if email:
+        pattern = f'%{email}%'
+        conditions.append(FormContainer.user_email.ilike(pattern) | FormContainer.manager_email.ilike(pattern))
+    if reference:
+        conditions.append(FormContainer.reference.ilike(f'%{reference}%'))
+    if status:
+        conditions.append(db.exists().where(Form.form_container_id == FormContainer.id, Form.status == status))
+    if initiated_by:
+        conditions.append(FormContainer.initiated_by == initiated_by)
+    if escalated is not None:
+        conditions.append(FormContainer.escalated.is_(escalated))
+    return conditions
+
+
+def facet_counts(conditions):
+    """Number of matching containers per form status, per initiator and per escalation state."""
+    matched = select(FormContainer.id).where(*conditions)
+    return {
+        "status": dict(db.session.execute(
+            select(Form.status, func.count(Form.form_container_id.distinct()))
+            .where(Form.form_container_id.in_(matched)).group_by(Form.status)
+        ).all()),
+        "initiated_by": dict(db.session.execute(
+            select(FormContainer.initiated_by, func.count()).where(*conditions).group_by(FormContainer.initiated_by)
+        ).all()),
+        "escalated": {
+            str(bool(escalated)).lower(): count for escalated, count in db.session.execute(
+                select(FormContainer.escalated, func.count()).where(*conditions).group_by(FormContainer.escalated)
+            )
+        },
+    }
+
+
+def rebuild_index():
+    """Rebuild every container's document from the source tables, batch by batch; returns the number indexed."""
+    db.session.execute(delete(ContainerSearch))
+    last_id = 0
+    indexed = 0
+    while True:
+        containers = db.session.execute(
+            select(FormContainer.id, FormContainer.title, FormContainer.description, FormContainer.reference,
+                   FormContainer.user_email, FormContainer.manager_email)
+            .where(FormContainer.id > last_id).order_by(FormContainer.id).limit(REINDEX_BATCH_SIZE)
+        ).all()
+        if not containers:
+            return indexed
+        answers = {}
+        for container_id, value_text, value_options in db.session.execute(
+            select(Form.form_container_id, Answer.value_text, Answer.value_options)
+            .join(Response, Response.form_id == Form.id).join(Answer, Answer.response_id == Response.id)
+            .where(Form.form_container_id.in_([container.id for container in containers]))
+            .order_by(Answer.id)
+        ):
+            answers.setdefault(container_id, []).append({"value_text": value_text, "value_options": value_options})
+        index_containers([
+            {
+                "container_id": container.id,
+                "document": ' '.join(filter(None, [
+                    container_text(container.title, container.description, container.reference,
+                                   container.user_email, container.manager_email),
+                    answers_text(answers.get(container.id, [])),
+                ])),
+            }
+            for container in containers
+        ])
+        db.session.commit()
+        indexed += len(containers)
+        last_id = containers[-1].id
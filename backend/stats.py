@@ -0,0 +1,231 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import db, FormContainer, Form, Response, TimelineEntry, ContainerStats, AnswerTimeBucket, ArchivedContainer
+
+STATUS_COLUMNS = {
+    'open': 'forms_open',
+    'answered': 'forms_answered',
+    'unsubstantial': 'forms_unsubstantial',
+    'validated': 'forms_validated',
+}
+# Upper bounds, in hours, of the time-to-answer histogram; the last bucket catches everything slower
+ANSWER_TIME_BUCKETS = [1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720, 2160, 1000000]
+# Session.info key of the deltas recorded in the current transaction
+PENDING_KEY = 'pending_stats'
+
+
+def stats_key(initiated_by, reference):
+    return initiated_by, reference or ''
+
+
+def ensure_row(model, **key):
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**key))
+    except IntegrityError:
+        pass
+
+
+def increment(model, key, **deltas):
+    """Add deltas to the row identified by key when the current transaction commits.
+
+    Rollup rows are shared by a whole campaign: deltas are summed per row and applied just before commit,
+    so each row is updated once per transaction and its lock is held only for the commit itself.
+    """
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    session = db.session()
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    session.info.setdefault(PENDING_KEY, []).append((transaction, model, tuple(sorted(key.items())), deltas))
+
+
+def apply_increment(model, key, **deltas):
+    """Atomically add deltas to the row identified by key, creating the row on first use."""
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    statement = update(model).filter_by(**key).values(
+        {column: getattr(model, column) + delta for column, delta in deltas.items()}
+    ).execution_options(synchronize_session=False)
+    if db.session.execute(statement).rowcount == 0:
+        ensure_row(model, **key)
+        db.session.execute(statement)
+
+
+def within(transaction, ancestor):
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, 'before_commit')
+def apply_pending(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    totals = {}
+    for _, model, key, deltas in pending:
+        totals.setdefault((model.__tablename__, key), (model, Counter()))[1].update(deltas)
+    # Always the same order, so concurrent commits lock the rollup rows in the same sequence
+    for (_, key), (model, deltas) in sorted(totals.items(), key=lambda item: item[0]):
+        apply_increment(model, dict(key), **deltas)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_rolled_back(session, previous_transaction):
+    # A rolled back savepoint only drops the deltas recorded inside it
+    pending = session.info.get(PENDING_KEY)
+    if pending:
+        session.info[PENDING_KEY] = [entry for entry in pending if not within(entry[0], previous_transaction)]
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+
+
+def record(initiated_by, reference, **deltas):
+    initiated_by, reference = stats_key(initiated_by, reference)
+    increment(ContainerStats, dict(initiated_by=initiated_by, reference=reference), **deltas)
+
+
+def record_status_change(form_container, old_status, new_status):
+    deltas = Counter()
+    if old_status in STATUS_COLUMNS:
+        deltas[STATUS_COLUMNS[old_status]] -= 1
+    if new_status in STATUS_COLUMNS:
+        deltas[STATUS_COLUMNS[new_status]] += 1
+    record(form_container.initiated_by, form_container.reference, **deltas)
+
+
+def answer_time_bucket(elapsed):
+    hours = elapsed.total_seconds() / 3600
+    return next(bucket for bucket in ANSWER_TIME_BUCKETS if hours <= bucket)
+
+
+def record_answer(form_container, submitted_at, first_response):
+    record(form_container.initiated_by, form_container.reference,
+           responses=1, responded_containers=1 if first_response else 0)
+    initiated_by, reference = stats_key(form_container.initiated_by, form_container.reference)
+    increment(AnswerTimeBucket, dict(
+        initiated_by=initiated_by,
+        reference=reference,
+        bucket_hours=answer_time_bucket(submitted_at - form_container.created_at)
+    ), count=1)
+
+
+def median_answer_hours(buckets):
+    """Approximate median from a {bucket_hours: count} histogram: the upper bound of the median's bucket."""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen * 2 >= total:
+            return bucket
+
+
+def serialize_stats(row, buckets):
+    return {
+        "initiated_by": row.initiated_by,
+        "reference": row.reference or None,
+        "containers": row.containers,
+        "forms_by_status": {status: getattr(row, column) for status, column in STATUS_COLUMNS.items()},
+        "responses": row.responses,
+        "response_rate": row.responded_containers / row.containers if row.containers else None,
+        "median_time_to_answer_hours": median_answer_hours(buckets),
+        "reminders_sent": row.reminders_sent,
+        "escalations": row.escalations,
+        "escalation_rate": row.escalations / row.containers if row.containers else None,
+        "updated_at": row.updated_at,
+    }
+
+
+def rebuild_stats():
+    """Recompute every rollup row from the source tables, replacing the incremental counters."""
+    reference = func.coalesce(FormContainer.reference, '')
+    rows = {}
+
+    def row(key):
+        return rows.setdefault(key, Counter())
+
+    for initiated_by, ref, containers in db.session.execute(
+        select(FormContainer.initiated_by, reference, func.count()).group_by(FormContainer.initiated_by, reference)
+    ):
+        row((initiated_by, ref))['containers'] = containers
+
+    # escalated only describes the latest form, so escalated containers are counted from the timeline
+    for initiated_by, ref, escalations in db.session.execute(
+        select(FormContainer.initiated_by, reference, func.count(FormContainer.id.distinct()))
+        .join(TimelineEntry, TimelineEntry.form_container_id == FormContainer.id)
+        .where(TimelineEntry.event == 'Escalation sent')
+        .group_by(FormContainer.initiated_by, reference)
+    ):
+        row((initiated_by, ref))['escalations'] = escalations
+
+    for initiated_by, ref, status, count in db.session.execute(
+        select(FormContainer.initiated_by, reference, Form.status, func.count())
+        .join(Form, Form.form_container_id == FormContainer.id)
+        .group_by(FormContainer.initiated_by, reference, Form.status)
+    ):
+        if status in STATUS_COLUMNS:
+            row((initiated_by, ref))[STATUS_COLUMNS[status]] += count
+
+    for initiated_by, ref, responses, responded_containers in db.session.execute(
+        select(FormContainer.initiated_by, reference, func.count(), func.count(FormContainer.id.distinct()))
+        .join(Form, Form.form_container_id == FormContainer.id)
+        .join(Response, Response.form_id == Form.id)
+        .group_by(FormContainer.initiated_by, reference)
+    ):
+        row((initiated_by, ref)).update(responses=responses, responded_containers=responded_containers)
+
+    for initiated_by, ref, reminders in db.session.execute(
+        select(FormContainer.initiated_by, reference, func.count())
+        .join(TimelineEntry, TimelineEntry.form_container_id == FormContainer.id)
+        .where(TimelineEntry.event.like('Reminder %'))
+        .group_by(FormContainer.initiated_by, reference)
+    ):
+        row((initiated_by, ref))['reminders_sent'] += reminders
+
+    buckets = Counter()
+    for initiated_by, ref, submitted_at, created_at in db.session.execute(
+        select(FormContainer.initiated_by, reference, Response.submitted_at, FormContainer.created_at)
+        .join(Form, Form.form_container_id == FormContainer.id)
+        .join(Response, Response.form_id == Form.id)
+        .execution_options(yield_per=10000)
+    ):
+        buckets[(initiated_by, ref, answer_time_bucket(submitted_at - created_at))] += 1
+
+    # Archived containers are no longer in the tables above; each archive row carries its own share
+    for initiated_by, ref, contribution in db.session.execute(
+        select(ArchivedContainer.initiated_by, func.coalesce(ArchivedContainer.reference, ''), ArchivedContainer.stats)
+        .execution_options(yield_per=10000)
+    ):
+        contribution = dict(contribution)
+        for bucket, count in contribution.pop('answer_buckets').items():
+            buckets[(initiated_by, ref, int(bucket))] += count
+        row((initiated_by, ref)).update(contribution)
+
+    db.session.execute(delete(AnswerTimeBucket))
+    db.session.execute(delete(ContainerStats))
+    now = datetime.utcnow()
+    if rows:
+        db.session.execute(insert(ContainerStats), [
+            dict(counts, initiated_by=initiated_by, reference=ref, updated_at=now)
+            for (initiated_by, ref), counts in rows.items()
+        ])
+    if buckets:
+        db.session.execute(insert(AnswerTimeBucket), [
+            dict(initiated_by=initiated_by, reference=ref, bucket_hours=bucket, count=count)
+            for (initiated_by, ref, bucket), count in buckets.items()
+        ])
+    return len(rows)
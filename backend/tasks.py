@@ -1,79 +1,238 @@
-from datetime import datetime
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
 
-from celery import shared_task
-from models import FormContainer, TimelineEntry
-from email_manager import send_email
+from celery import group, shared_task
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from models import FormContainer, TimelineEntry, EmailOutbox
+from email_manager import send_many, recipient_domain, domain_rate_limit, reserve_domain_quota
+from config import Config
 from extensions import db
+from cache import invalidate_timelines
+from events import entry_event, publish_events
+from tokens import sign_access_token
+import stats
+import bulk
+import archive
+import search
+import metrics  # registers the Celery runtime and queue lag signal handlers
 
 MAX_REMINDERS = 3
 REMINDER_INTERVAL = 86400
+SWEEP_BATCH_SIZE = 500
 
+logger = logging.getLogger(__name__)
+
+
+def reminder_interval(reminder_delay):
+    if reminder_delay:
+        return timedelta(days=reminder_delay)
+    return timedelta(seconds=REMINDER_INTERVAL)
+
+
+def schedule_reminders(form_container, now=None):
+    """(Re)start the reminder cycle for the latest form; the beat sweeper picks the container up once it is due."""
+    form_container.reminder_count = 0
+    form_container.escalated = False
+    form_container.next_reminder_at = (now or datetime.utcnow()) + reminder_interval(form_container.reminder_delay)
+
+
+def cancel_reminders(form_container):
+    form_container.next_reminder_at = None
 
-@shared_task
-def send_reminder_task(container_id, reminder_count=1):
-    """Send a reminder and schedule the next reminder if limit is not reached."""
-    form_container = FormContainer.query.get(container_id)
-    if not form_container:
-        return "FormContainer not found"
 
+def enqueue_email(form_container, to, subject, body, link=None, idempotency_key=None, kind='notification'):
+    """Write the email to the outbox; it is committed with the caller's transaction and sent by deliver_outbox."""
+    db.session.add(EmailOutbox(
+        form_container=form_container,
+        to=to,
+        subject=subject,
+        body=body,
+        link=link,
+        idempotency_key=idempotency_key,
+        kind=kind
+    ))
+
+
+# Keyed by form: adding a form restarts the reminder cycle, and its reminders must not collide with the previous ones
+def reminder_key(container_id, form_id, reminder_number):
+    return f"reminder:{container_id}:{form_id}:{reminder_number}"
+
+
+def escalation_key(container_id, form_id):
+    return f"escalation:{container_id}:{form_id}"
+
+
+def process_reminder(form_container):
+    """Queue the next reminder, or escalate once MAX_REMINDERS have been sent, and reschedule."""
     latest_form = form_container.forms[-1] if form_container.forms else None
-    if latest_form and latest_form.status == 'open':
-        # Send the reminder email
-        send_email(
-            to=form_container.user_email,
-            subject="Reminder: Please respond to the form",
-            body=f"Please respond to the form {form_container.title}."
-        )
-        timeline_entry = TimelineEntry(
-            form_container_id=container_id,
-            event=f"Reminder {reminder_count} sent",
-            timestamp=datetime.utcnow(),
-            details=f"Reminder {reminder_count} sent to user {form_container.user_email}"
-        )
-        db.session.add(timeline_entry)
-        form_container.last_reminder_sent = datetime.utcnow()
-        form_container.reminder_count += 1
-        db.session.commit()
+    if form_container.validated or not latest_form or latest_form.status != 'open':
+        cancel_reminders(form_container)
+        return "No reminder needed - form is no longer open"
 
-        # Check if we've reached the maximum number of reminders
-        if reminder_count < MAX_REMINDERS:
-            send_reminder_task.apply_async((container_id, reminder_count + 1), countdown=REMINDER_INTERVAL)
-        else:
-            if form_container.escalate:
-                escalate_task.apply_async((container_id,), countdown=REMINDER_INTERVAL)
-        return f"Reminder {reminder_count} sent"
+    if form_container.reminder_count >= MAX_REMINDERS:
+        cancel_reminders(form_container)
+        if form_container.escalate and not form_container.escalated:
+            return escalate(form_container)
+        return "No reminder needed - maximum reminders reached"
 
-    return "No reminder needed - form is no longer open"
+    now = datetime.utcnow()
+    reminder_count = form_container.reminder_count + 1
+    enqueue_email(
+        form_container,
+        to=form_container.user_email,
+        subject="Reminder: Please respond to the form",
+        body=f"Please respond to the form {form_container.title}.",
+        link=sign_access_token(form_container.access_token),
+        idempotency_key=reminder_key(form_container.id, latest_form.id, reminder_count),
+        kind='reminder'
+    )
+    timeline_entry = TimelineEntry(
+        form_container_id=form_container.id,
+        event=f"Reminder {reminder_count} sent",
+        timestamp=now,
+        details=f"Reminder {reminder_count} sent to user {form_container.user_email}"
+    )
+    db.session.add(timeline_entry)
+    form_container.last_reminder_sent = now
+    stats.record(form_container.initiated_by, form_container.reference, reminders_sent=1)
+    form_container.reminder_count = reminder_count
+    form_container.next_reminder_at = now + reminder_interval(form_container.reminder_delay)
+    return f"Reminder {reminder_count} sent"
 
 
-@shared_task
-def escalate_task(container_id):
-    """Send an escalation email if the form is still incomplete."""
-    form_container = FormContainer.query.get(container_id)
-    if not form_container:
-        return "FormContainer not found"
+def escalate(form_container):
+    # The rollup counts escalated containers, so only a container's first escalation adds to it
+    first_escalation = not db.session.query(TimelineEntry.id).filter_by(
+        form_container_id=form_container.id, event="Escalation sent"
+    ).first()
+    enqueue_email(
+        form_container,
+        to=form_container.manager_email,
+        subject="Escalation: User has not responded to the form",
+        body=f"The user has not responded to the form {form_container.title}.",
+        idempotency_key=escalation_key(form_container.id, form_container.forms[-1].id),
+        kind='escalation'
+    )
+    timeline_entry = TimelineEntry(
+        form_container_id=form_container.id,
+        event="Escalation sent",
+        timestamp=datetime.utcnow(),
+        details=f"Escalation sent to manager {form_container.manager_email}"
+    )
+    db.session.add(timeline_entry)
+    form_container.escalated = True
+    if first_escalation:
+        stats.record(form_container.initiated_by, form_container.reference, escalations=1)
+    return "Escalation sent"
+
 
+def escalate_if_open(form_container):
     latest_form = form_container.forms[-1] if form_container.forms else None
-    if latest_form and latest_form.status == 'open':
-        # Send escalation email to the manager
-        send_email(
-            to=form_container.manager_email,
-            subject="Escalation: User has not responded to the form",
-            body=f"The user has not responded to the form {form_container.title}."
-        )
-        timeline_entry = TimelineEntry(
-            form_container_id=container_id,
-            event="Escalation sent",
-            timestamp=datetime.utcnow(),
-            details=f"Escalation sent to manager {form_container.manager_email}"
-        )
-        db.session.add(timeline_entry)
-        form_container.escalated = True
+    if not latest_form or latest_form.status != 'open':
+        return "No escalation needed - form is no longer open"
+    if form_container.escalated:
+        return "No escalation needed - already escalated"
+    return escalate(form_container)
+
+
+def pending_timeline_events(form_containers):
+    """Events for the timeline entries added to the session but not yet committed."""
+    initiated_by = {form_container.id: form_container.initiated_by for form_container in form_containers}
+    return [
+        entry_event(entry, initiated_by.get(entry.form_container_id), escalated=entry.event == "Escalation sent")
+        for entry in db.session.new if isinstance(entry, TimelineEntry)
+    ]
+
+
+@shared_task
+def dispatch_due_reminders():
+    """Beat entry point: select containers whose reminder is due and fan them out to workers in chunks.
+
+    The chunks are published as one group, so the whole sweep goes to the broker in a single round trip.
+    Pages follow the (next_reminder_at, id) index, so the sweep only reads due rows, each of them once.
+    """
+    now = datetime.utcnow()
+    due = db.session.query(FormContainer.id, FormContainer.next_reminder_at).filter(
+        FormContainer.next_reminder_at <= now
+    ).order_by(FormContainer.next_reminder_at, FormContainer.id)
+    rows = due.limit(SWEEP_BATCH_SIZE).all()
+    chunks = []
+    while rows:
+        chunks.append([row.id for row in rows])
+        last = rows[-1]
+        # The >= bound lets the index range scan start at the previous page's last row
+        rows = due.filter(
+            FormContainer.next_reminder_at >= last.next_reminder_at,
+            or_(FormContainer.next_reminder_at > last.next_reminder_at, FormContainer.id > last.id)
+        ).limit(SWEEP_BATCH_SIZE).all()
+    if chunks:
+        group(process_reminder_batch.s(container_ids) for container_ids in chunks).apply_async()
+    return f"{sum(len(container_ids) for container_ids in chunks)} reminders dispatched"
+
+
+def claim_containers(container_ids, due_only=True):
+    """Load and lock the containers; rows already locked by another worker are skipped rather than waited for."""
+    query = FormContainer.query.options(selectinload(FormContainer.forms)).filter(FormContainer.id.in_(container_ids))
+    if due_only:
+        query = query.filter(FormContainer.next_reminder_at <= datetime.utcnow())
+    return query.order_by(FormContainer.id).with_for_update(skip_locked=True, of=FormContainer).all()
+
+
+def run_claimed(container_ids, handler, due_only=True):
+    """Apply handler to each claimed container and commit once; returns the handler results.
 
+    Claiming makes concurrent and redelivered tasks safe: a container locked by another worker is skipped, and
+    once a reminder is committed the container is no longer due. Where row locks are not available (SQLite)
+    the outbox idempotency keys are the backstop: on a duplicate the chunk is replayed one container per
+    savepoint, dropping the containers another worker already handled.
+    """
+    try:
+        form_containers = claim_containers(container_ids, due_only)
+        results = [handler(form_container) for form_container in form_containers]
+        events = pending_timeline_events(form_containers)
         db.session.commit()
-        return "Escalation sent"
+    except IntegrityError:
+        db.session.rollback()
+        processed, results = [], []
+        for form_container in claim_containers(container_ids, due_only):
+            try:
+                with db.session.begin_nested():
+                    result = handler(form_container)
+            except IntegrityError:
+                logger.info("FormContainer %s already handled by another worker", form_container.id)
+                continue
+            processed.append(form_container)
+            results.append(result)
+        form_containers = processed
+        events = pending_timeline_events(form_containers)
+        db.session.commit()
+    invalidate_timelines([form_container.id for form_container in form_containers])
+    publish_events(events)
+    return results
+
+
+@shared_task(acks_late=True)
+def process_reminder_batch(container_ids):
+    """Process a chunk of due containers with a single load and a single commit."""
+    results = run_claimed(container_ids, process_reminder)
+    return f"{len(results)} containers processed"
+
 
-    return "No escalation needed - form is no longer open"
+@shared_task(acks_late=True)
+def send_reminder_task(container_id):
+    """Send the next reminder for a single container if it is due."""
+    results = run_claimed([container_id], process_reminder)
+    return results[0] if results else "No reminder due - not found, already sent or being processed"
+
+
+@shared_task(acks_late=True)
+def escalate_task(container_id):
+    """Send an escalation email if the form is still incomplete."""
+    results = run_claimed([container_id], escalate_if_open, due_only=False)
+    return results[0] if results else "FormContainer not found or being processed"
 
 
 def run_delayed_workflow(container_id):
@@ -83,16 +242,117 @@ def run_delayed_workflow(container_id):
         print("FormContainer not found")
         return
 
-    # Start with the first reminder
-    send_reminder_task.apply_async((container_id, 1), countdown=REMINDER_INTERVAL)
+    schedule_reminders(form_container)
+    db.session.commit()
 
 
-def send_initial_notification_task(container_id):
-    form_container = FormContainer.query.get(container_id)
-    if form_container:
-        send_email(
-            to=form_container.user_email,
-            subject="New Form Notification",
-            body=f"A new form has been created with the title: {form_container.title}.",
-            link=form_container.access_token
-        )
+def initial_notification(form_container_id, user_email, title, access_token):
+    """Outbox row for the first notification, as a dict for bulk insertion."""
+    return dict(
+        form_container_id=form_container_id,
+        to=user_email,
+        subject="New Form Notification",
+        body=f"A new form has been created with the title: {title}.",
+        link=access_token,
+        kind='notification'
+    )
+
+
+def split_by_domain_quota(entries):
+    """Entries that fit in their recipient domain's per-minute quota, and the entries to defer to the next minute."""
+    wanted = Counter(recipient_domain(entry.to) for entry in entries)
+    quotas = reserve_domain_quota({domain: count for domain, count in wanted.items() if domain_rate_limit(domain)})
+    allowed, deferred = [], []
+    for entry in entries:
+        domain = recipient_domain(entry.to)
+        if domain not in quotas:
+            allowed.append(entry)
+        elif quotas[domain] > 0:
+            quotas[domain] -= 1
+            allowed.append(entry)
+        else:
+            deferred.append(entry)
+    return allowed, deferred
+
+
+@shared_task
+def deliver_outbox(kind=None):
+    """Send one batch of pending outbox emails of kind (all kinds if None); failed sends are retried with backoff."""
+    now = datetime.utcnow()
+    query = EmailOutbox.query.filter(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+    if kind:
+        query = query.filter(EmailOutbox.kind == kind)
+    entries = query.order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(Config.OUTBOX_BATCH_SIZE).with_for_update(
+        skip_locked=True
+    ).all()
+    if not entries:
+        return "0 emails sent"
+
+    entries, deferred = split_by_domain_quota(entries)
+    next_window = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    for entry in deferred:
+        entry.next_attempt_at = next_window
+
+    messages = [dict(to=entry.to, subject=entry.subject, body=entry.body, link=entry.link) for entry in entries]
+    try:
+        errors = {id(message): str(error) for message, error in send_many(messages)}
+    except Exception as e:
+        errors = {id(message): str(e) for message in messages}
+
+    for entry, message in zip(entries, messages):
+        if id(message) not in errors:
+            entry.status = 'sent'
+            entry.sent_at = now
+            continue
+        entry.attempts += 1
+        entry.last_error = errors[id(message)]
+        if entry.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+            entry.status = 'failed'
+        else:
+            entry.next_attempt_at = now + timedelta(seconds=Config.OUTBOX_RETRY_DELAY * 2 ** (entry.attempts - 1))
+    db.session.commit()
+    if deferred:
+        return f"{len(entries) - len(errors)} emails sent, {len(deferred)} deferred by domain rate limits"
+    return f"{len(entries) - len(errors)} emails sent"
+
+
+@shared_task(bind=True)
+def bulk_action_task(self, action, admin_id, container_ids=None, filters=None):
+    """Run a bulk admin action chunk by chunk, publishing progress in the task state (PROGRESS meta)."""
+    total = bulk.count_containers(container_ids, filters)
+
+    def report_progress(processed, changed):
+        self.update_state(state='PROGRESS', meta={
+            "action": action, "total": total, "processed": processed, "changed": changed
+        })
+
+    return dict(bulk.run_bulk_action(action, admin_id, container_ids, filters, report_progress), total=total)
+
+
+@shared_task
+def archive_validated_containers():
+    """Beat entry point: move containers validated more than ARCHIVE_AFTER_DAYS ago to the archive, batch by batch."""
+    cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+    last_id = 0
+    archived = 0
+    while True:
+        container_ids = archive.archivable_container_ids(cutoff, last_id)
+        if not container_ids:
+            break
+        archived += archive.archive_containers(container_ids)
+        last_id = container_ids[-1]
+    return f"{archived} containers archived"
+
+
+@shared_task
+def rebuild_search_index_task():
+    """Re-index every container, e.g. after enabling search on an existing database."""
+    return f"{search.rebuild_index()} containers indexed"
+
+
+@shared_task
+def rebuild_stats_task():
+    """Recompute the dashboard rollup from scratch, correcting any drift in the incremental counters."""
+    groups = stats.rebuild_stats()
+    db.session.commit()
+    return f"{groups} stats groups rebuilt"
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app import app as flask_app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def create_container(client):
+    """Factory creating a container through the API; returns the creation response body."""
+    def create(**payload):
+        data = {
+            "title": "Titre", "description": "Description", "user_email": "user@example.com",
+            "manager_email": "manager@example.com", "reference": "REF",
+            "forms": {"questions": [{"label": "Question 1", "type": "text"}]},
+        }
+        data.update(payload)
+        response = client.post('/form-containers', json=data)
+        assert response.status_code == 201
+        return response.get_json()
+    return create
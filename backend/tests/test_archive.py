@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from cache import cached_container_id
+from extensions import db
+from models import ArchivedContainer, FormContainer
+import tasks
+
+
+def test_archive_job_archives_every_batch_and_forgets_tokens(app, client, create_container, monkeypatch):
+    monkeypatch.setattr(tasks.Config, 'ARCHIVE_BATCH_SIZE', 2)
+    created = [create_container() for _ in range(5)]
+    for container in created:
+        assert client.get(f'/form-containers/{container["access_token"]}').status_code == 200
+        response = client.post(f'/form-containers/{container["container_id"]}/forms/{container["form_id"]}/validate')
+        assert response.status_code == 200
+    FormContainer.query.update({'updated_at': datetime.utcnow() - timedelta(days=tasks.Config.ARCHIVE_AFTER_DAYS + 1)})
+    db.session.commit()
+
+    assert tasks.archive_validated_containers() == "5 containers archived"
+
+    assert FormContainer.query.count() == 0
+    assert ArchivedContainer.query.count() == 5
+    for container in created:
+        assert cached_container_id(container["access_token"].split('.')[0]) is None
+        assert client.get(f'/form-containers/{container["access_token"]}').status_code == 200
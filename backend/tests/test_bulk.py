@@ -0,0 +1,21 @@
+from models import FormContainer
+import bulk
+import tasks
+
+
+def test_close_stops_escalation_but_keeps_the_setting_for_the_next_form(client, create_container):
+    created = create_container(escalate=True)
+    container_id = created["container_id"]
+
+    result = bulk.run_bulk_action('close', 'admin', container_ids=[container_id])
+    assert result["changed"] == 1
+    container = FormContainer.query.get(container_id)
+    assert (container.next_reminder_at, container.escalate, container.escalated) == (None, True, True)
+    assert tasks.escalate_task(container_id) == "No escalation needed - already escalated"
+    assert bulk.run_bulk_action('close', 'admin', container_ids=[container_id])["changed"] == 0
+
+    response = client.post(f'/form-containers/{container_id}/forms',
+                           json={"questions": [{"label": "Question 2", "type": "text"}]})
+    assert response.status_code == 201
+    container = FormContainer.query.get(container_id)
+    assert container.escalate and not container.escalated and container.next_reminder_at is not None
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+import redis
+
+import cache
+from cache import ResponseCache, cached_json_response
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def make_cache(server):
+    response_cache = ResponseCache(None, 300, 100, 30, local_ttl=5)
+    response_cache.redis = fakeredis.FakeRedis(server=server)
+    return response_cache
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def test_body_built_before_an_invalidation_is_not_served(app, server, monkeypatch):
+    response_cache = make_cache(server)
+    monkeypatch.setattr(cache, 'response_cache', response_cache)
+    state = {"version": 1}
+
+    def build_while_a_write_commits():
+        body = {"version": state["version"]}
+        state["version"] = 2
+        response_cache.invalidate("key")
+        return body
+
+    with app.test_request_context('/'):
+        assert cached_json_response("key", build_while_a_write_commits).get_json() == {"version": 1}
+        assert cached_json_response("key", lambda: dict(state)).get_json() == {"version": 2}
+        assert cached_json_response("key", lambda: {"version": "rebuilt"}).get_json() == {"version": 2}
+
+
+def test_invalidation_reaches_redis_while_this_process_considers_it_down(server):
+    writer, reader = make_cache(server), make_cache(server)
+    body, generation = reader.get_current("key")
+    reader.set_current("key", b"OLD", generation)
+
+    writer._redis_down_until = time.monotonic() + 30
+    writer.invalidate("key")
+
+    assert reader.get_current("key")[0] is None
+
+
+def test_failed_invalidation_is_replayed_before_redis_is_used_again(server, monkeypatch):
+    writer, reader = make_cache(server), make_cache(server)
+    reader.set_current("key", b"OLD", reader.get_current("key")[1])
+
+    def unreachable(keys):
+        raise redis.ConnectionError("down")
+
+    monkeypatch.setattr(writer, '_send_invalidations', unreachable)
+    writer.invalidate("key")
+    monkeypatch.undo()
+    assert reader.get_current("key")[0] == b"OLD"
+
+    writer._redis_down_until = 0
+    assert writer.get_current("key")[0] is None
+    assert reader.get_current("key")[0] is None
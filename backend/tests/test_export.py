@@ -0,0 +1,13 @@
+def test_csv_export_without_responses_is_just_the_header(client):
+    response = client.get('/responses/export?format=csv&reference=none')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == (
+        "response_id,container_id,form_id,reference,initiated_by,responder_uid,"
+        "submitted_at,question_id,question_label,response\r\n"
+    )
+
+
+def test_export_rejects_a_non_integer_container_id(client):
+    response = client.get('/responses/export?container_id=abc')
+    assert response.status_code == 400
+    assert client.get('/responses/export?submitted_from=hier').status_code == 400
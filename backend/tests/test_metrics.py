@@ -0,0 +1,25 @@
+from celery.signals import worker_init
+from prometheus_client import REGISTRY
+
+import metrics
+
+
+def test_worker_exports_its_metrics_on_the_worker_port(monkeypatch):
+    started = []
+    monkeypatch.setattr(metrics.Config, 'METRICS_WORKER_PORT', 9808)
+    monkeypatch.setattr(metrics, 'start_http_server', lambda port, registry: started.append((port, registry)))
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+
+    worker_init.send(sender=None)
+
+    assert started == [(9808, REGISTRY)]
+
+
+def test_worker_exporter_is_disabled_without_a_port(monkeypatch):
+    started = []
+    monkeypatch.setattr(metrics.Config, 'METRICS_WORKER_PORT', 0)
+    monkeypatch.setattr(metrics, 'start_http_server', lambda port, registry: started.append(port))
+
+    worker_init.send(sender=None)
+
+    assert started == []
@@ -0,0 +1,22 @@
+import pytest
+
+PAYLOAD = {
+    "title": "Titre", "description": "Description", "user_email": "user@example.com",
+    "forms": {"questions": [{"label": "Question 1", "type": "text"}]},
+}
+
+
+@pytest.mark.parametrize('changes', [
+    {"recipients": ["x@example.com"]},
+    {"recipients": [{"user_email": "x@example.com"}], "forms": [1]},
+    {"recipients": [{"user_email": "x@example.com"}], "forms": {"questions": ["q"]}},
+])
+def test_bulk_creation_rejects_malformed_payloads_with_400(client, changes):
+    assert client.post('/form-containers/bulk', json=[PAYLOAD]).status_code == 400
+    response = client.post('/form-containers/bulk', json=dict(PAYLOAD, **changes))
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('payload', [[PAYLOAD], dict(PAYLOAD, forms=[1]), dict(PAYLOAD, forms={"questions": ["q"]})])
+def test_creation_rejects_malformed_payloads_with_400(client, payload):
+    assert client.post('/form-containers', json=payload).status_code == 400
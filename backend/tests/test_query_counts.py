@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from cache import invalidate_container
+from extensions import db
+
+QUESTIONS = [{"label": "Question 1", "type": "text"}, {"label": "Question 2", "type": "text"}]
+
+
+def create_container(client, forms):
+    """Container with forms forms, each answered once."""
+    created = client.post('/form-containers', json={
+        "title": "Titre", "description": "Description", "user_email": "user@example.com",
+        "manager_email": "manager@example.com", "reference": "REF", "forms": {"questions": QUESTIONS},
+    }).get_json()
+    form_id = created["form_id"]
+    for index in range(forms):
+        if index:
+            form_id = client.post(f'/form-containers/{created["container_id"]}/forms',
+                                  json={"questions": QUESTIONS}).get_json()["form_id"]
+        questions = client.get(f'/form-containers/{created["access_token"]}').get_json()["forms"][-1]["questions"]
+        response = client.post(f'/form-containers/{created["access_token"]}/forms/{form_id}/submit-response', json={
+            "questions": [{"id": question["id"], "response": f"Réponse {index}"} for question in questions]
+        })
+        assert response.status_code == 200
+    return created
+
+
+def count_queries(client, container):
+    """Number of SQL statements run by an uncached GET of the container."""
+    invalidate_container(container["access_token"].split('.')[0], container["container_id"])
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(f'/form-containers/{container["access_token"]}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+
+def test_get_form_container_query_count_does_not_grow_with_forms(client):
+    small = create_container(client, forms=1)
+    large = create_container(client, forms=5)
+
+    small_count, _ = count_queries(client, small)
+    large_count, body = count_queries(client, large)
+
+    assert len(body["forms"]) == 5
+    assert all(form["responses"] and form["questions"][0]["response"] for form in body["forms"])
+    assert large_count == small_count
+    assert large_count <= 4
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import EmailOutbox, FormContainer
+import tasks
+
+
+def make_due(container_id):
+    FormContainer.query.filter_by(id=container_id).update({'next_reminder_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def run_cycle(container_id):
+    results = []
+    for _ in range(tasks.MAX_REMINDERS + 1):
+        make_due(container_id)
+        results.append(tasks.send_reminder_task(container_id))
+    return results
+
+
+def test_form_added_after_escalation_gets_its_own_reminders_and_escalation(client, create_container):
+    created = create_container(escalate=True)
+    container_id = created["container_id"]
+    expected = [f"Reminder {n} sent" for n in range(1, tasks.MAX_REMINDERS + 1)] + ["Escalation sent"]
+    assert run_cycle(container_id) == expected
+
+    response = client.post(f'/form-containers/{container_id}/forms',
+                           json={"questions": [{"label": "Question 2", "type": "text"}]})
+    assert response.status_code == 201
+
+    assert run_cycle(container_id) == expected
+    assert EmailOutbox.query.filter_by(kind='reminder').count() == 2 * tasks.MAX_REMINDERS
+    assert EmailOutbox.query.filter_by(kind='escalation').count() == 2
@@ -0,0 +1,21 @@
+import pytest
+
+from config import Config
+
+
+@pytest.mark.parametrize('token', ['abc.%C3%A9', '%C3%A9.abc', '%C3%A9'])
+def test_non_ascii_tokens_are_rejected_with_404(client, token):
+    assert client.get(f'/form-containers/{token}').status_code == 404
+    assert client.post(f'/form-containers/{token}/forms/1/submit-response', json={}).status_code == 404
+
+
+def test_signed_token_is_required_unless_unsigned_tokens_are_accepted(client, create_container, monkeypatch):
+    created = create_container()
+    access_token, signature = created["access_token"].split('.')
+    assert client.get(f'/form-containers/{created["access_token"]}').status_code == 200
+    assert client.get(f'/form-containers/{access_token}.{signature[::-1]}').status_code == 404
+
+    monkeypatch.setattr(Config, 'ACCESS_TOKEN_ACCEPT_UNSIGNED', True)
+    assert client.get(f'/form-containers/{access_token}').status_code == 200
+    monkeypatch.setattr(Config, 'ACCESS_TOKEN_ACCEPT_UNSIGNED', False)
+    assert client.get(f'/form-containers/{access_token}').status_code == 404
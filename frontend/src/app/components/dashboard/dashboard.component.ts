@@ -17,6 +17,8 @@ export class DashboardComponent implements OnInit {
   searchValue: string | undefined;
   currentView: string = 'loading';
   loading: boolean = false;
+  loadingMore: boolean = false;
+  nextCursor: string | null = null;
   status: string = 'answered';
   filterDates: Date[] = [];
   minDate: Date = new Date(new Date().setFullYear(new Date().getFullYear() - 1));
@@ -59,9 +61,11 @@ export class DashboardComponent implements OnInit {
 
   loadForms(status: string) {
     this.loading = true;
+    this.nextCursor = null;
     this.formService.getFormContainersByStatus(status).subscribe(
-      (data) => {
-        this.forms = data;
+      (page) => {
+        this.forms = page.forms;
+        this.nextCursor = page.nextCursor;
         this.currentView = 'table';
         this.loading = false;
       },
@@ -70,6 +74,27 @@ export class DashboardComponent implements OnInit {
       }
     );
   }
+
+  loadMoreForms() {
+    if (!this.nextCursor || this.loadingMore) {
+      return;
+    }
+    const status = this.status;
+    this.loadingMore = true;
+    this.formService.getFormContainersByStatus(status, this.nextCursor).subscribe(
+      (page) => {
+        // Ignore a page that arrives after the user switched tabs
+        if (status === this.status) {
+          this.forms = [...this.forms, ...page.forms];
+          this.nextCursor = page.nextCursor;
+        }
+        this.loadingMore = false;
+      },
+      (error) => {
+        this.loadingMore = false;
+      }
+    );
+  }
 filterGlobal(table: Table, event: Event) {
   const input = event.target as HTMLInputElement;
   console.log('Filter value:', input.value);
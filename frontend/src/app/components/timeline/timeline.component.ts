@@ -1,7 +1,10 @@
-import { Component, OnInit, Input } from '@angular/core';
-import { FormService } from '../../services/form.service';
+import { Component, OnInit, OnDestroy, Input } from '@angular/core';
+import { EMPTY, Subscription, defer } from 'rxjs';
+import { catchError, concatMap } from 'rxjs/operators';
+import { FormService, TimelinePage } from '../../services/form.service';
 
 interface EventItem {
+    id?: number;
     event?: string;
     timestamp?: string;
     details?: string;
@@ -12,22 +15,54 @@ interface EventItem {
   templateUrl: './timeline.component.html',
   styleUrl: './timeline.component.scss'
 })
-export class TimelineComponent implements OnInit {
+export class TimelineComponent implements OnInit, OnDestroy {
   @Input() formContainerId!: number;
   events: EventItem[] = [];
+  private cursor: string | null = null;
+  private seenIds = new Set<number>();
+  private loadSubscription?: Subscription;
+  private eventsSubscription?: Subscription;
   constructor(private formService: FormService) {}
   ngOnInit() {
     this.loadTimeline();
   }
 
+  ngOnDestroy() {
+    this.loadSubscription?.unsubscribe();
+    this.eventsSubscription?.unsubscribe();
+  }
+
   loadTimeline(){
-      this.formService.getFormContainerTimeline(this.formContainerId).subscribe(
-        (data) => {
-          this.events = data;
+      this.loadSubscription = this.formService.getFormContainerTimelineFrom(this.formContainerId).subscribe(
+        (page) => {
+          this.append(page);
+          // Opened only once the timeline is loaded, so a pushed entry can neither be overwritten nor duplicated
+          this.watchTimeline();
         },
         (error) => {
           console.error('Erreur lors de la récupération des données', error);
         }
       );
     }
+
+  // Each push (or reconnection) fetches the entries after the cursor, one fetch at a time
+  private watchTimeline() {
+    this.eventsSubscription = this.formService.watchFormContainerEvents(this.formContainerId).pipe(
+      concatMap(() => defer(() => this.formService.getFormContainerTimelineFrom(this.formContainerId, this.cursor)).pipe(
+        catchError((error) => {
+          console.error('Erreur lors de la mise à jour de la timeline', error);
+          return EMPTY;
+        })
+      ))
+    ).subscribe((page) => this.append(page));
+  }
+
+  private append(page: TimelinePage) {
+    const entries = page.entries.filter((entry) => !this.seenIds.has(entry.id));
+    entries.forEach((entry) => this.seenIds.add(entry.id));
+    if (entries.length) {
+      this.events = [...this.events, ...entries];
+    }
+    this.cursor = page.nextCursor;
+  }
 }
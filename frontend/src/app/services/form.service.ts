@@ -1,7 +1,21 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpParams } from '@angular/common/http';
 import { environment } from '../../environments/environment';
-import { Observable } from 'rxjs';
+import { EMPTY, Observable } from 'rxjs';
+import { expand, map, reduce } from 'rxjs/operators';
+
+// Page size used when following a timeline past its first page
+const TIMELINE_PAGE_SIZE = 500;
+
+export interface TimelinePage {
+  entries: any[];
+  nextCursor: string | null;
+}
+
+export interface FormContainerPage {
+  forms: any[];
+  nextCursor: string | null;
+}
 
 @Injectable({
   providedIn: 'root'
@@ -31,13 +45,54 @@ export class FormService {
       );
   }
 
-  getFormContainerTimeline(formContainerId: number): Observable<any> {
-    return this.http.get(`${this.apiUrl}/${formContainerId}/timeline`);
+  // One page of the timeline, oldest first; without since this is the first page, which the API caches
+  getFormContainerTimeline(formContainerId: number, since?: string | null): Observable<any> {
+    let params = new HttpParams();
+    if (since) {
+      params = params.set('since', since).set('limit', TIMELINE_PAGE_SIZE);
+    }
+    return this.http.get(`${this.apiUrl}/${formContainerId}/timeline`, { params });
+  }
+
+  // Every timeline entry after since (all of them without it), following next_cursor until has_more is false;
+  // nextCursor is the since to pass on the next call
+  getFormContainerTimelineFrom(formContainerId: number, since?: string | null): Observable<TimelinePage> {
+    return this.getFormContainerTimeline(formContainerId, since).pipe(
+      expand((page: any) => page.has_more ? this.getFormContainerTimeline(formContainerId, page.next_cursor) : EMPTY),
+      reduce(
+        (result: TimelinePage, page: any) => ({ entries: result.entries.concat(page.entries), nextCursor: page.next_cursor }),
+        { entries: [], nextCursor: since || null }
+      )
+    );
+  }
+
+  // Emits whenever the timeline may have changed: on each pushed entry and on each (re)connection of the stream,
+  // since entries pushed while disconnected are lost
+  watchFormContainerEvents(formContainerId: number): Observable<any> {
+    return new Observable(observer => {
+      if (typeof EventSource === 'undefined') {
+        observer.complete();
+        return;
+      }
+      const source = new EventSource(`${this.apiUrl}/${formContainerId}/events`);
+      source.addEventListener('open', () => observer.next({ type: 'open' }));
+      source.addEventListener('timeline', (event: MessageEvent) => observer.next(JSON.parse(event.data)));
+      return () => source.close();
+    });
   }
 
-  getFormContainersByStatus(status: string): Observable<any> {
-  const url = `${this.apiUrl}?filter=status&status=${status}`;
-  return this.http.get<any[]>(url);
+  // One page of containers, newest first; pass the returned nextCursor to get the following page
+  getFormContainersByStatus(status: string, cursor?: string | null): Observable<FormContainerPage> {
+    let params = new HttpParams().set('filter', 'status').set('status', status);
+    if (cursor) {
+      params = params.set('cursor', cursor);
+    }
+    return this.http.get<any[]>(this.apiUrl, { params, observe: 'response' }).pipe(
+      map(response => ({
+        forms: response.body || [],
+        nextCursor: response.headers.get('X-Next-Cursor')
+      }))
+    );
   }
 
   validateFormContainer(formContainerId: number, formId: number): Observable<any> {